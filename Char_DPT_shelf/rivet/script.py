@@ -1,4 +1,5 @@
 import maya.cmds as cmds
+import maya.api.OpenMaya as om2
 
 
 def rivet(seurface='', edges=[], out='locator'):
@@ -47,19 +48,18 @@ def rivet(seurface='', edges=[], out='locator'):
     return nameLocator
 
 
-def an_convertSliceToList(pList):
-    output = list()
-    for pName in pList:
-        if '.' in pName:
-            iRenge = pName.split(']')[0].split('[')[1]
-            if ':' in iRenge:
-                for i in range(int(iRenge.split(':')[0]), int(iRenge.split(':')[1]) + 1):
-                    output.append(pName.split('[')[0] + '[' + str(i) + ']')
-            else:
-                output.append(pName)
-        else:
-            output.append(pName)
-    return output
+def component_indices(components):
+    """
+    Indices of single indexed components ('pCube1.e[0:20]') read from the component objects,
+    index ranges are not expanded into one name per component
+    """
+    sel = om2.MSelectionList()
+    for component in components:
+        sel.add(component)
+    indices = list()
+    for i in range(sel.length()):
+        indices += list(om2.MFnSingleIndexedComponent(sel.getComponent(i)[1]).getElements())
+    return indices
 
 
 def getNum(comp):
@@ -74,14 +74,13 @@ def do_rivet():
         rivet(surface, [getNum(sel[0]), getNum(sel[1])])
     else:
         sel = cmds.filterExpand(sm=34)  # get face
-        edges = an_convertSliceToList(cmds.polyListComponentConversion(sel, te=True))  # get edges
-        data = dict()
-        for edg in edges:
-            pt = an_convertSliceToList(cmds.polyListComponentConversion(edg, tv=True))
-            data[edg] = [getNum(x) for x in pt]
+        edges = component_indices(cmds.polyListComponentConversion(sel, te=True))  # get edges
+        shape = om2.MSelectionList()
+        shape.add(surface)
+        mesh = om2.MFnMesh(shape.getDagPath(0).extendToShape())
+        data = dict((edg, list(mesh.getEdgeVertices(edg))) for edg in edges)
         egesCapl = [x for x in edges[1:] if
                     (data[edges[0]][0] not in data[x]) and (data[edges[0]][1] not in data[x])] + [edges[0]]
-        print surface, getNum(egesCapl[0]), getNum(egesCapl[1])
-        rivet(surface, edges=[getNum(egesCapl[0]), getNum(egesCapl[1])])
+        rivet(surface, edges=[egesCapl[0], egesCapl[1]])
 
 do_rivet()
\ No newline at end of file
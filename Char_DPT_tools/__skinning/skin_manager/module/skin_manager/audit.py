@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Skin weight statistics of many geometries for the scene audit. Works without Maya.
+Every geometry is measured in one pass over its sparse weight arrays, the report is exported as json or csv.
+"""
+import csv
+import json
+import sys
+from collections import OrderedDict
+
+COLUMNS = ('geometry', 'vertices', 'influences', 'unnormalized', 'over_limit', 'max_per_vertex', 'near_zero',
+           'unused_influences')
+
+
+def audit_weights(geo, skin_weights, max_influences=4, min_weight=0.001, tolerance=0.001):
+    """
+    :param max_influences: vertices with more weights are counted as over the limit (0 for no limit)
+    :param min_weight: stored weights below it are counted as near zero
+    :param tolerance: vertices whose weight sum differs from 1.0 by more are counted as unnormalized
+    :return: OrderedDict with the COLUMNS keys, unused_influences is a list of names
+    """
+    offsets, values = skin_weights.offsets, skin_weights.values
+    unnormalized = over_limit = max_per_vertex = 0
+    for vertex in range(skin_weights.vertex_count):
+        start, end = offsets[vertex], offsets[vertex + 1]
+        count = end - start
+        if count > max_per_vertex:
+            max_per_vertex = count
+        if max_influences and count > max_influences:
+            over_limit += 1
+        if abs(sum(values[start:end]) - 1.0) > tolerance:
+            unnormalized += 1
+    used = set(skin_weights.indices)
+    return OrderedDict((('geometry', geo),
+                        ('vertices', skin_weights.vertex_count),
+                        ('influences', skin_weights.influence_count),
+                        ('unnormalized', unnormalized),
+                        ('over_limit', over_limit),
+                        ('max_per_vertex', max_per_vertex),
+                        ('near_zero', sum(1 for x in values if x < min_weight)),
+                        ('unused_influences', [x for i, x in enumerate(skin_weights.influences) if i not in used])))
+
+
+def audit(weights, max_influences=4, min_weight=0.001, tolerance=0.001):
+    """
+    :param weights: {geometry: SkinWeights}
+    :return: [audit_weights row] in the order of the geometries
+    """
+    return [audit_weights(geo, skin_weights, max_influences, min_weight, tolerance)
+            for geo, skin_weights in weights.items()]
+
+
+def write_json(path, report):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+
+def write_csv(path, report):
+    """
+    One line per geometry, unused influences are joined with spaces
+    """
+    f = open(path, 'wb') if sys.version_info[0] < 3 else open(path, 'w', newline='')
+    with f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in report:
+            writer.writerow([' '.join(row[x]) if x == 'unused_influences' else row[x] for x in COLUMNS])
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Component index sets kept as sorted ranges, the form Maya selections use ('pCube1.vtx[0:50000]').
+Ranges are never expanded into one name per component: the component object and the selection strings are
+built only when they are asked for. Parsing and the set operations work without Maya.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+COMPONENT_PATTERN = re.compile(r'^(.+)\.(\w+)\[(\d+)(?::(\d+))?\]$')
+
+# component name in selection strings: MFn type of the single indexed component
+COMPONENT_TYPES = {'vtx': 'kMeshVertComponent', 'e': 'kMeshEdgeComponent', 'f': 'kMeshPolygonComponent',
+                   'map': 'kMeshMapComponent', 'cv': 'kCurveCVComponent'}
+
+
+def _merge(ranges):
+    """
+    :param ranges: [(first, last)] inclusive, in any order
+    :return: sorted ranges without overlapping or touching neighbours
+    """
+    merged = list()
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class ComponentSet(object):
+    """
+    Components of one kind on one node as sorted inclusive index ranges [(first, last)]
+    """
+
+    def __init__(self, node, kind='vtx', ranges=None):
+        self.node = node
+        self.kind = kind
+        self.ranges = _merge(ranges or list())
+        self._component = None
+
+    @classmethod
+    def from_indices(cls, node, indices, kind='vtx'):
+        ranges = list()
+        for index in sorted(set(indices)):
+            if ranges and index == ranges[-1][1] + 1:
+                ranges[-1][1] = index
+            else:
+                ranges.append([index, index])
+        return cls(node, kind, [tuple(x) for x in ranges])
+
+    @classmethod
+    def from_strings(cls, selection):
+        """
+        Parses names like 'pCube1.vtx[4]' or 'pCube1.vtx[0:50]', names without a single index are skipped
+        :return: [ComponentSet] one per node and component kind, in the order of the selection
+        """
+        ranges = OrderedDict()
+        for name in selection:
+            match = COMPONENT_PATTERN.match(name)
+            if not match:
+                continue
+            node, kind, first, last = match.groups()
+            ranges.setdefault((node, kind), list()).append((int(first), int(last if last else first)))
+        return [cls(node, kind, value) for (node, kind), value in ranges.items()]
+
+    @classmethod
+    def from_component(cls, node, component_obj, kind='vtx'):
+        """
+        :param component_obj: single indexed component MObject (maya.api)
+        """
+        import maya.api.OpenMaya as om2
+        return cls.from_indices(node, om2.MFnSingleIndexedComponent(component_obj).getElements(), kind)
+
+    def component(self):
+        """
+        Single indexed component MObject of the set, built on the first call
+        """
+        if self._component is None:
+            import maya.api.OpenMaya as om2
+            component = om2.MFnSingleIndexedComponent()
+            self._component = component.create(getattr(om2.MFn, COMPONENT_TYPES[self.kind]))
+            component.addElements(self.indices().tolist())
+        return self._component
+
+    def strings(self):
+        """
+        Selection names, one per range
+        """
+        prefix = '%s.%s' % (self.node, self.kind)
+        return [prefix + ('[%d]' % first if first == last else '[%d:%d]' % (first, last))
+                for first, last in self.ranges]
+
+    def indices(self):
+        """
+        :return: all indices as array('i')
+        """
+        indices = array('i')
+        for first, last in self.ranges:
+            indices.extend(range(first, last + 1))
+        return indices
+
+    def __len__(self):
+        return sum(last - first + 1 for first, last in self.ranges)
+
+    def __iter__(self):
+        for first, last in self.ranges:
+            for index in range(first, last + 1):
+                yield index
+
+    def __contains__(self, index):
+        i = bisect_right(self.ranges, (index, float('inf'))) - 1
+        return i >= 0 and self.ranges[i][0] <= index <= self.ranges[i][1]
+
+    def __eq__(self, other):
+        return isinstance(other, ComponentSet) and \
+            (self.node, self.kind, self.ranges) == (other.node, other.kind, other.ranges)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ComponentSet(%r, %r, %r)' % (self.node, self.kind, self.ranges)
+
+    def _check(self, other):
+        if (self.node, self.kind) != (other.node, other.kind):
+            raise ValueError('Components of %s.%s and %s.%s can not be combined'
+                             % (self.node, self.kind, other.node, other.kind))
+
+    def union(self, other):
+        self._check(other)
+        return ComponentSet(self.node, self.kind, self.ranges + other.ranges)
+
+    def intersection(self, other):
+        self._check(other)
+        ranges = list()
+        i = j = 0
+        while i < len(self.ranges) and j < len(other.ranges):
+            first = max(self.ranges[i][0], other.ranges[j][0])
+            last = min(self.ranges[i][1], other.ranges[j][1])
+            if first <= last:
+                ranges.append((first, last))
+            if self.ranges[i][1] < other.ranges[j][1]:
+                i += 1
+            else:
+                j += 1
+        return ComponentSet(self.node, self.kind, ranges)
+
+    def difference(self, other):
+        self._check(other)
+        ranges = list()
+        j = 0
+        for first, last in self.ranges:
+            while j < len(other.ranges) and other.ranges[j][1] < first:
+                j += 1
+            k = j
+            while k < len(other.ranges) and other.ranges[k][0] <= last:
+                if other.ranges[k][0] > first:
+                    ranges.append((first, other.ranges[k][0] - 1))
+                first = max(first, other.ranges[k][1] + 1)
+                k += 1
+            if first <= last:
+                ranges.append((first, last))
+        return ComponentSet(self.node, self.kind, ranges)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Mirroring of skin weights in memory. Works without Maya.
+Every vertex gets the row of the vertex closest to its mirrored position, with the influence columns swapped
+for their opposite influences, so the weights are written back to the skinCluster once.
+Symmetry maps are cached on disk, keyed by the topology fingerprint and a hash of the rest (bind pose) positions,
+so posing the mesh does not build a new map. The least recently used map files are deleted.
+"""
+import json
+import os
+import zlib
+from array import array
+
+from name_mapping import name_similarity
+from spatial import PointGrid, clusters
+
+MAX_FILES = 64  # symmetry map files kept in the cache directory
+
+def mirrored(point, axis=0):
+    return tuple(-x if d == axis else x for d, x in enumerate(point))
+
+
+def symmetry_map(points, axis=0):
+    """
+    :param points: [(x, y, z)] vertex positions
+    :return: [index of the vertex closest to the mirrored position of every vertex]
+    """
+    grid = PointGrid(points)
+    return [grid.nearest(mirrored(point, axis))[0][0] for point in points]
+
+
+def rest_hash(points):
+    """
+    :param points: flat x, y, z positions
+    """
+    data = array('f', points)
+    return zlib.crc32(data.tobytes() if hasattr(data, 'tobytes') else data.tostring()) & 0xFFFFFFFF
+
+
+class SymmetryMap(object):
+    """
+    Opposite vertex of every vertex and the vertices on the mirror plane
+    """
+
+    def __init__(self, symmetry, center, axis=0, tolerance=0.01):
+        self.symmetry = array('i', symmetry)
+        self.center = array('i', center)
+        self.axis = axis
+        self.tolerance = tolerance
+
+    @classmethod
+    def build(cls, points, axis=0, tolerance=0.01):
+        """
+        :param points: [(x, y, z)] vertex positions
+        """
+        center = [i for i, point in enumerate(points) if abs(point[axis]) <= tolerance]
+        return cls(symmetry_map(points, axis), center, axis, tolerance)
+
+    def save(self, path):
+        """
+        One json line (axis, tolerance, counts) followed by the int32 symmetry and center arrays
+        """
+        header = json.dumps({'axis': self.axis, 'tolerance': self.tolerance,
+                             'vertex_count': len(self.symmetry), 'center_count': len(self.center)})
+        with open(path, 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n')
+            for data in (self.symmetry, self.center):
+                f.write(data.tobytes() if hasattr(data, 'tobytes') else data.tostring())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            arrays = list()
+            for count in (header['vertex_count'], header['center_count']):
+                data = array('i')
+                data.fromfile(f, count)
+                arrays.append(data)
+        return cls(arrays[0], arrays[1], header['axis'], header['tolerance'])
+
+
+class SymmetryCache(object):
+    """
+    Symmetry maps of the session, backed by one file per map in a project folder
+    """
+
+    def __init__(self, directory, max_files=MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        self._maps = dict()
+
+    def path(self, topology, points, axis=0, tolerance=0.01):
+        name = '%s_%08x_%d_%g.sym' % (topology.replace(':', '_'), rest_hash(points), axis, tolerance)
+        return os.path.join(self.directory, name)
+
+    def get(self, topology, points, axis=0, tolerance=0.01):
+        """
+        :param topology: fingerprint of the mesh
+        :param points: flat x, y, z rest positions of the vertices
+        :return: SymmetryMap, loaded or built (and saved) when the mesh or its rest shape is new
+        """
+        path = self.path(topology, points, axis, tolerance)
+        if path in self._maps:
+            return self._maps[path]
+        if os.path.exists(path):
+            symmetry = SymmetryMap.load(path)
+            os.utime(path, None)  # the modification time tells the recently used maps
+        else:
+            symmetry = SymmetryMap.build([tuple(points[i:i + 3]) for i in range(0, len(points), 3)], axis, tolerance)
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            symmetry.save(path)
+            self.prune()
+        self._maps[path] = symmetry
+        return symmetry
+
+    def prune(self):
+        """
+        Deletes the least recently used map files above max_files
+        """
+        paths = [os.path.join(self.directory, x) for x in os.listdir(self.directory) if x.endswith('.sym')]
+        for path in sorted(paths, key=os.path.getmtime, reverse=True)[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+
+def opposite_name(name, name_pairs):
+    """
+    :param name_pairs: [(left prefix, right prefix)]
+    :return: the name with the prefix of the other side, None if the name has no side prefix
+    """
+    for left, right in name_pairs:
+        if name.startswith(left):
+            return right + name[len(left):]
+        if name.startswith(right):
+            return left + name[len(right):]
+    return None
+
+
+def pair_influences(influences, positions, name_pairs, axis=0, tolerance=0.01, joint_clusters=None):
+    """
+    Finds the opposite of every influence: by the side prefix of its name, otherwise by the influences found at
+    its mirrored position. Influences that share a position are paired by name similarity, the most similar
+    pairs first. Influences without an opposite (center joints) are paired with themselves.
+    :param positions: {influence: world position}
+    :param joint_clusters: [[influence]] groups of coincident influences (spatial.clusters), found when not given
+    :return: {influence: opposite influence}
+    """
+    pairs = dict()
+    for name in influences:
+        opposite = opposite_name(name, name_pairs)
+        if name not in pairs and opposite in influences and opposite not in pairs:
+            pairs[name] = opposite
+            pairs[opposite] = name
+
+    names = [x for x in influences if x in positions and x not in pairs]
+    if joint_clusters is None:
+        joint_clusters = [[names[i] for i in group] for group in clusters([positions[x] for x in names], tolerance)]
+    # every position is looked up once: a group of coincident influences against the group at its mirror
+    unpaired = set(names)
+    groups = [[x for x in group if x in unpaired] for group in joint_clusters]
+    groups = [x for x in groups if x]
+    grouped = set(x for group in groups for x in group)
+    groups += [[x] for x in names if x not in grouped]
+    grid = PointGrid([positions[group[0]] for group in groups])
+    candidates = list()
+    for group in groups:
+        for i in grid.query_radius(mirrored(positions[group[0]], axis), tolerance):
+            candidates.extend((name_similarity(name, opposite), name, opposite)
+                              for name in group for opposite in groups[i])
+    for similarity, name, opposite in sorted(candidates, reverse=True):
+        if name not in pairs and opposite not in pairs:
+            pairs[name] = opposite
+            pairs[opposite] = name
+
+    for name in influences:
+        pairs.setdefault(name, name)
+    return pairs
+
+
+def mirror_weights(skin_weights, points, pairs, axis=0, positive_to_negative=True, center_tolerance=0.01,
+                   symmetry=None):
+    """
+    Copies the weights of one side of the mesh onto the other
+    :param points: [(x, y, z)] vertex positions
+    :param pairs: {influence: opposite influence} as pair_influences returns it
+    :param center_tolerance: vertices closer to the mirror plane keep their weights (without a symmetry map)
+    :param symmetry: SymmetryMap of the mesh, its center vertices keep their weights; built when it is not given
+    :return: new SkinWeights with the same influences
+    """
+    symmetry = symmetry or SymmetryMap.build(points, axis, center_tolerance)
+    center = set(symmetry.center)
+    symmetry = symmetry.symmetry
+    column_map = [skin_weights.index(pairs.get(name, name)) for name in skin_weights.influences]
+    blend_weights = list(skin_weights.blend_weights)
+    rows = list()
+    for vertex, point in enumerate(points):
+        coordinate = point[axis] if positive_to_negative else -point[axis]
+        if coordinate < 0.0 and vertex not in center:
+            source = symmetry[vertex]
+            rows.append(skin_weights.interpolate([(source, 1.0)], column_map))
+            if len(blend_weights) == len(points):
+                blend_weights[vertex] = skin_weights.blend_weights[source]
+        else:
+            rows.append(skin_weights.row(vertex))
+    result = skin_weights.remap(skin_weights.influences)
+    result.blend_weights = blend_weights
+    result._set_rows(rows)
+    return result
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Translation of object names saved in a weight file to the names in the scene. Works without Maya.
+Mappings can be kept as named presets in a json file (one file per project).
+Missing influences can be matched to scene objects by their saved world position and name similarity.
+"""
+import difflib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from spatial import PointGrid
+
+NAMESPACE_ADD = 'namespace_add'
+NAMESPACE_SUB = 'namespace_sub'
+REGEX = 'regex'
+
+
+def _namespace(namespace):
+    return namespace if namespace.endswith(':') else namespace + ':'
+
+
+class NameMapping(object):
+    """
+    Explicit name pairs plus an ordered list of rules (namespace add/subtract, regex substitution).
+    Rules are compiled when added, translated names are cached, the weights themselves are never touched.
+    """
+
+    def __init__(self, pairs=None, rules=None):
+        self.pairs = dict(pairs or dict())
+        self.rules = list()  # [{'type': ..., ...}] in the order they are applied
+        self._compiled = list()
+        self._cache = dict()
+        for rule in rules or list():
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        """
+        :param rule: {'type': 'namespace_add', 'namespace': 'ns'}, {'type': 'namespace_sub', 'namespace': 'ns'}
+                     or {'type': 'regex', 'pattern': '^old_', 'replacement': 'new_'}
+        :return: the compiled rule, a function name -> name
+        """
+        if rule['type'] == NAMESPACE_ADD:
+            namespace = _namespace(rule['namespace'])
+            compiled = lambda name: name if name.startswith(namespace) else namespace + name
+        elif rule['type'] == NAMESPACE_SUB:
+            pattern = re.compile('^' + re.escape(_namespace(rule['namespace'])))
+            compiled = lambda name: pattern.sub('', name)
+        elif rule['type'] == REGEX:
+            pattern = re.compile(rule['pattern'])
+            replacement = rule['replacement']
+            compiled = lambda name: pattern.sub(replacement, name)
+        else:
+            raise ValueError('Unknown name mapping rule: ' + str(rule['type']))
+        self.rules.append(dict(rule))
+        self._compiled.append(compiled)
+        self._cache.clear()
+        return compiled
+
+    def add_namespace(self, namespace):
+        return self.add_rule({'type': NAMESPACE_ADD, 'namespace': namespace})
+
+    def remove_namespace(self, namespace):
+        return self.add_rule({'type': NAMESPACE_SUB, 'namespace': namespace})
+
+    def add_regex(self, pattern, replacement):
+        return self.add_rule({'type': REGEX, 'pattern': pattern, 'replacement': replacement})
+
+    def set_pair(self, name, new_name):
+        self.pairs[name] = new_name
+        self._cache.pop(name, None)
+
+    def translate(self, name):
+        """
+        An explicit pair wins, otherwise all rules are applied in order
+        """
+        if name in self._cache:
+            return self._cache[name]
+        if name in self.pairs:
+            new_name = self.pairs[name]
+        else:
+            new_name = name
+            for rule in self._compiled:
+                new_name = rule(new_name)
+        self._cache[name] = new_name
+        return new_name
+
+    def candidates(self, name):
+        """
+        Names to look for in the scene, best first: the translated name, then the saved one
+        """
+        new_name = self.translate(name)
+        return [new_name] if new_name == name else [new_name, name]
+
+    def to_dict(self):
+        return {'pairs': dict(self.pairs), 'rules': [dict(x) for x in self.rules]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(pairs=data.get('pairs'), rules=data.get('rules'))
+
+
+def read_presets(path):
+    """
+    :return: OrderedDict {preset name: NameMapping.to_dict()}, empty if the file does not exist yet
+    """
+    if not os.path.exists(path):
+        return OrderedDict()
+    with open(path, 'r') as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def write_presets(path, presets):
+    with open(path, 'w') as f:
+        json.dump(presets, f, indent=4)
+
+
+def short_name(name):
+    """
+    Name without dag path and namespaces
+    """
+    return name.split('|')[-1].split(':')[-1]
+
+
+def name_similarity(name, other):
+    return difflib.SequenceMatcher(None, short_name(name).lower(), short_name(other).lower()).ratio()
+
+
+def match_influences(missing, saved_positions, scene_positions, tolerance=0.05, min_similarity=0.6, margin=0.1):
+    """
+    Suggests scene objects for missing influences.
+    Objects found within the tolerance of the saved position are ranked by name similarity: a single candidate,
+    or a best candidate ahead of the second by the margin, is a confident match.
+    Without a candidate at the position the most similar name is suggested, but never as a confident match.
+    :param missing: saved influence names that are not in the scene
+    :param saved_positions: {saved name: world position} from the weight file
+    :param scene_positions: {scene name: world position} of free candidates
+    :return: {missing name: (scene name, confident)}, names without any candidate are left out
+    """
+    names = list(scene_positions)
+    grid = PointGrid([scene_positions[x] for x in names])
+    by_short_name = dict()
+    for name in names:
+        by_short_name.setdefault(short_name(name), list()).append(name)
+
+    matches = dict()
+    for name in missing:
+        close = list()
+        if name in saved_positions and names:
+            close = [names[i] for i in grid.query_radius(saved_positions[name], tolerance)]
+        if close:
+            ranked = sorted(((name_similarity(name, x), x) for x in close), reverse=True)
+            confident = len(ranked) == 1 or ranked[0][0] - ranked[1][0] >= margin
+            matches[name] = (ranked[0][1], confident)
+            continue
+        similar = difflib.get_close_matches(short_name(name), list(by_short_name), n=1, cutoff=min_similarity)
+        if similar:
+            matches[name] = (by_short_name[similar[0]][0], False)
+
+    # one scene object can not take the weights of two saved influences without a confirmation
+    targets = [x[0] for x in matches.values()]
+    for name, (target, confident) in matches.items():
+        if confident and targets.count(target) > 1:
+            matches[name] = (target, False)
+    return matches
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Weights of a saved mesh projected onto another vertex set by the vertex positions stored in the weight file.
+Works without Maya, so a weight file can be used as a transfer source without its mesh in the scene.
+"""
+from skin_weights import SkinWeights
+from spatial import PointGrid, closest_on_triangle
+
+NEAREST = 'nearest'
+BARYCENTRIC = 'barycentric'
+
+
+class PointCloudSource(object):
+    """
+    Saved vertex positions with a point grid. With the saved connectivity the faces around the nearest vertex
+    are searched for the closest point, otherwise the nearest vertex is used.
+    """
+
+    def __init__(self, skin_weights, mode=BARYCENTRIC):
+        if not skin_weights.points:
+            raise ValueError('No vertex positions are saved with the weights')
+        self.weights = skin_weights
+        points = skin_weights.points
+        self.points = [tuple(points[i:i + 3]) for i in range(0, len(points), 3)]
+        self.grid = PointGrid(self.points)
+        self.vertex_triangles = None  # [[(vertex, vertex, vertex)] around every vertex]
+        if mode == BARYCENTRIC and skin_weights.connectivity:
+            self.vertex_triangles = [list() for _ in self.points]
+            polygon_counts, polygon_connects = skin_weights.connectivity
+            position = 0
+            for count in polygon_counts:
+                face = polygon_connects[position:position + count]
+                position += count
+                for i in range(1, count - 1):  # fan triangulation, good enough for a closest point search
+                    triangle = (face[0], face[i], face[i + 1])
+                    for vertex in triangle:
+                        self.vertex_triangles[vertex].append(triangle)
+
+    def closest(self, point):
+        """
+        :return: distance, [(saved vertex, barycentric factor)]
+        """
+        vertex, distance = self.grid.nearest(point)[0]
+        if not self.vertex_triangles or not self.vertex_triangles[vertex]:
+            return distance, [(vertex, 1.0)]
+        best = None
+        for triangle in self.vertex_triangles[vertex]:
+            distance_sq, factors = closest_on_triangle(point, *[self.points[x] for x in triangle])
+            if best is None or distance_sq < best[0]:
+                best = distance_sq, list(zip(triangle, factors))
+        return best[0] ** 0.5, best[1]
+
+
+def remap_weights(skin_weights, points, mode=BARYCENTRIC):
+    """
+    :param points: [(x, y, z)] world positions of the new vertices
+    :param mode: NEAREST takes the row of the closest saved vertex, BARYCENTRIC blends the closest saved face
+    :return: SkinWeights for the new vertices
+    """
+    source = PointCloudSource(skin_weights, mode)
+    rows = [skin_weights.interpolate(source.closest(point)[1]) for point in points]
+    remapped = SkinWeights(skin_weights.influences, len(rows), skinning_method=skin_weights.skinning_method,
+                           influence_positions=skin_weights.influence_positions)
+    remapped._set_rows(rows)
+    return remapped
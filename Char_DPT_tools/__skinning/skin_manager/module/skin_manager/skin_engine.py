@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk access to skinCluster weights through the OpenMaya API.
+All the weights of a geometry are read by one MFnSkinCluster call instead of a command per influence.
+"""
+from array import array
+from collections import OrderedDict
+from itertools import chain
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from components import ComponentSet
+from skin_weights import SkinWeights
+from topology import fingerprint
+
+CHUNK_SIZE = 4000000  # max number of weights expanded into one dense setWeights buffer
+
+
+class SceneNames(object):
+    """
+    Resolves a set of object names against the scene with one 'ls' query.
+    Every name is looked up once, however many geometries refer to it.
+    """
+
+    def __init__(self, names):
+        names = set(names)
+        self.types = dict()  # requested name -> node type
+
+        found = cmds.ls(list(names), long=True, showType=True) if names else list()
+        # a long name answers for every trailing part of its path: '|grp|ns:jnt' -> 'ns:jnt', 'grp|ns:jnt'...
+        by_path = dict()
+        for long_name, node_type in zip(found[::2], found[1::2]):
+            parts = long_name.split('|')
+            for i in range(len(parts)):
+                by_path.setdefault('|'.join(parts[i:]), set()).add((long_name, node_type))
+        for name in names:
+            matches = by_path.get(name)
+            if matches:
+                self.types[name] = sorted(matches)[0][1]
+
+    @classmethod
+    def for_geometries(cls, influences):
+        """
+        :param influences: {geometry: [influence names]}, both geometries and influences are resolved
+        """
+        return cls(list(influences) + [x for geo in influences for x in influences[geo]])
+
+    def exists(self, name):
+        return name in self.types
+
+    def node_type(self, name):
+        return self.types.get(name)
+
+    def missing(self, names):
+        return [x for x in names if x not in self.types]
+
+
+def get_skin_cluster(geo):
+    skin_cluster = cmds.ls(cmds.listHistory(geo), type='skinCluster')
+    if not skin_cluster:
+        shape = cmds.listRelatives(geo, s=True)[0]
+        skin_cluster = cmds.ls(cmds.listHistory(shape), type='skinCluster')
+    if skin_cluster:
+        return skin_cluster[0]
+    else:
+        return None
+
+
+def get_shape_path(geo):
+    """
+    Dag path of the visible (deformed) shape of the geometry
+    """
+    if cmds.objectType(geo, isAType='transform'):
+        geo = cmds.listRelatives(geo, shapes=True, noIntermediate=True, fullPath=True)[0]
+    sel = om2.MSelectionList()
+    sel.add(geo)
+    return sel.getDagPath(0)
+
+
+def get_complete_component(shape_path):
+    """
+    Component object that covers all control points of the shape
+    """
+    if shape_path.hasFn(om2.MFn.kMesh):
+        component = om2.MFnSingleIndexedComponent()
+        component_obj = component.create(om2.MFn.kMeshVertComponent)
+        component.setCompleteData(om2.MFnMesh(shape_path).numVertices)
+    elif shape_path.hasFn(om2.MFn.kNurbsCurve):
+        component = om2.MFnSingleIndexedComponent()
+        component_obj = component.create(om2.MFn.kCurveCVComponent)
+        component.setCompleteData(om2.MFnNurbsCurve(shape_path).numCVs)
+    elif shape_path.hasFn(om2.MFn.kNurbsSurface):
+        surface = om2.MFnNurbsSurface(shape_path)
+        component = om2.MFnDoubleIndexedComponent()
+        component_obj = component.create(om2.MFn.kSurfaceCVComponent)
+        component.setCompleteData(surface.numCVsInU, surface.numCVsInV)
+    else:
+        raise RuntimeError('Unsupported geometry type: ' + shape_path.partialPathName())
+    return component_obj
+
+
+def get_topology(shape_path):
+    """
+    :return: vertex count, polygon counts, polygon connects of a mesh
+    """
+    mesh = om2.MFnMesh(shape_path)
+    polygon_counts, polygon_connects = mesh.getVertices()
+    return mesh.numVertices, polygon_counts, polygon_connects
+
+
+def _flat_points(points):
+    """
+    :param points: MPointArray
+    :return: flat x, y, z array('d')
+    """
+    raw = array('d', chain.from_iterable(points))  # x, y, z, w per point
+    flat = array('d', [0.0]) * (len(raw) // 4 * 3)
+    for axis in range(3):
+        flat[axis::3] = raw[axis::4]
+    return flat
+
+
+def get_points(shape_path, space=om2.MSpace.kWorld):
+    """
+    Snapshot of the mesh vertex positions from one MFnMesh.getPoints call
+    :return: flat x, y, z array('d')
+    """
+    return _flat_points(om2.MFnMesh(shape_path).getPoints(space))
+
+
+def get_rest_points(geo, skin_cluster=None):
+    """
+    World positions of the mesh vertices as they enter the skinCluster: the bind pose whatever the current pose,
+    read from the input geometry of the cluster and its bind matrix of the geometry.
+    A mesh without a skinCluster is not deformed by one, its current world positions are returned.
+    :return: flat x, y, z array('d')
+    """
+    shape_path = get_shape_path(geo)
+    if not shape_path.hasFn(om2.MFn.kMesh):
+        raise RuntimeError('Not a polygon mesh: ' + geo)
+    skin_cluster = skin_cluster or get_skin_cluster(geo)
+    if not skin_cluster:
+        return get_points(shape_path)
+    skin_fn = get_skin_fn(skin_cluster)
+    plug = skin_fn.findPlug('input', False).elementByLogicalIndex(skin_fn.indexForOutputShape(shape_path.node()))
+    mesh_data = plug.child(skin_fn.attribute('inputGeometry')).asMObject()
+    matrix = om2.MMatrix(cmds.getAttr(skin_cluster + '.geomMatrix'))
+    return _flat_points([x * matrix for x in om2.MFnMesh(mesh_data).getPoints()])
+
+
+def vertex_component(indices):
+    """
+    Mesh vertex component with the given indices
+    """
+    component = om2.MFnSingleIndexedComponent()
+    component_obj = component.create(om2.MFn.kMeshVertComponent)
+    component.addElements(indices)
+    return component_obj
+
+
+def selected_vertices(selection):
+    """
+    Mesh vertices of the selection (faces and edges are converted), read from the component objects,
+    so index ranges are never expanded into one name per vertex
+    :param selection: component names as cmds.ls(sl=True) returns them
+    :return: OrderedDict {transform: ComponentSet}
+    """
+    vertices = OrderedDict()
+    components = cmds.polyListComponentConversion(selection, toVertex=True) if selection else None
+    sel = om2.MSelectionList()
+    for component in components or list():
+        sel.add(component)
+    for i in range(sel.length()):
+        shape_path, component_obj = sel.getComponent(i)
+        if component_obj.isNull():
+            continue
+        geo = om2.MDagPath(shape_path).pop().partialPathName()
+        component_set = ComponentSet.from_component(geo, component_obj)
+        vertices[geo] = vertices[geo] | component_set if geo in vertices else component_set
+    return vertices
+
+
+def mesh_fingerprint(geo):
+    """
+    Topology fingerprint of a mesh, None for other geometry types
+    """
+    shape_path = get_shape_path(geo)
+    if not shape_path.hasFn(om2.MFn.kMesh):
+        return None
+    return fingerprint(*get_topology(shape_path))
+
+
+def get_skin_fn(skin_cluster):
+    sel = om2.MSelectionList()
+    sel.add(skin_cluster)
+    return oma2.MFnSkinCluster(sel.getDependNode(0))
+
+
+def get_influences(skin_fn):
+    return [x.partialPathName() for x in skin_fn.influenceObjects()]
+
+
+def world_position(dag_path):
+    return tuple(om2.MTransformationMatrix(dag_path.inclusiveMatrix()).translation(om2.MSpace.kWorld))
+
+
+def get_world_positions(names):
+    """
+    World positions of transforms read in one pass through the API, names that are not dag objects are skipped
+    :return: {name: (x, y, z)}
+    """
+    positions = dict()
+    for name in names:
+        sel = om2.MSelectionList()
+        try:
+            sel.add(name)
+            positions[name] = world_position(sel.getDagPath(0))
+        except (RuntimeError, TypeError):
+            continue
+    return positions
+
+
+def read_weights(geo, with_points=False):
+    """
+    Reads the full vertex x influence matrix of the geometry with one MFnSkinCluster.getWeights call
+    :param with_points: keep the world positions of the mesh vertices in the bind pose as well
+    :return: SkinWeights
+    """
+    skin_cluster = get_skin_cluster(geo)
+    if not skin_cluster:
+        raise RuntimeError('No skinCluster found on ' + geo)
+    skin_fn = get_skin_fn(skin_cluster)
+    shape_path = get_shape_path(geo)
+    values, influence_count = skin_fn.getWeights(shape_path, get_complete_component(shape_path))
+    topology = connectivity = points = None
+    if shape_path.hasFn(om2.MFn.kMesh):
+        vertex_count, polygon_counts, polygon_connects = get_topology(shape_path)
+        topology = fingerprint(vertex_count, polygon_counts, polygon_connects)
+        connectivity = array('i', polygon_counts), array('i', polygon_connects)
+        if with_points:
+            points = get_rest_points(geo, skin_cluster)
+    influence_paths = skin_fn.influenceObjects()
+    influences = [x.partialPathName() for x in influence_paths]
+
+    skin_weights = SkinWeights.from_dense(influences, len(values) // influence_count if influence_count else 0,
+                                          array('d', values),
+                                          skinning_method=cmds.getAttr(skin_cluster + ".skinningMethod"),
+                                          blend_weights=cmds.getAttr(skin_cluster + ".paintWeights"),
+                                          influence_positions=dict((name, world_position(path)) for name, path
+                                                                   in zip(influences, influence_paths)),
+                                          topology=topology, connectivity=connectivity, points=points)
+
+    # influences whose inverse matrix drives something else are not saved (same rule as before)
+    keep = [jnt for jnt in influences if not cmds.connectionInfo(jnt + '.worldInverseMatrix[0]', isSource=True)]
+    if len(keep) != len(influences):
+        skin_weights = skin_weights.remap(keep)
+    return skin_weights
+
+
+def read_scene_weights():
+    """
+    Snapshot of every skinCluster in the scene for reports: one getWeights call per deformed geometry, all
+    influences are kept and nothing else (topology, positions, blend weights) is read
+    :return: OrderedDict {geometry transform: SkinWeights}
+    """
+    weights = OrderedDict()
+    for skin_cluster in cmds.ls(type='skinCluster'):
+        skin_fn = get_skin_fn(skin_cluster)
+        influences = get_influences(skin_fn)
+        geometries = skin_fn.getOutputGeometry()
+        for i in range(len(geometries)):
+            shape_path = om2.MDagPath.getAPathTo(geometries[i])
+            try:
+                component = get_complete_component(shape_path)
+            except RuntimeError:
+                continue  # lattices and other geometry without single or double indexed points
+            values, influence_count = skin_fn.getWeights(shape_path, component)
+            vertex_count = len(values) // influence_count if influence_count else 0
+            geo = om2.MDagPath(shape_path).pop().partialPathName()
+            weights[geo] = SkinWeights.from_dense(influences, vertex_count, array('d', values),
+                                                  skinning_method=cmds.getAttr(skin_cluster + ".skinningMethod"))
+    return weights
+
+
+def bind(geo, influences, scene_names=None):
+    """
+    Creates a new skinCluster with the given influences (joints go first, geometry influences are added after)
+    At least one of the influences has to be a joint
+    :param scene_names: SceneNames already resolved for these influences
+    """
+    scene_names = scene_names or SceneNames(influences)
+    joints = [x for x in influences if scene_names.node_type(x) == 'joint']
+    if not joints:
+        # skinCluster needs a joint to bind to, geometry influences can only be added afterwards
+        raise RuntimeError('"' + geo + '" can not be bound: none of its influences is a joint (' +
+                           ', '.join(influences) + ')')
+    others = [x for x in influences if x not in joints]
+    cmds.select(cl=True)
+    skin_cluster = cmds.skinCluster(joints, geo, tsb=True, normalizeWeights=True)[0]
+    if others:
+        cmds.setAttr(skin_cluster + ".useComponents", 1)
+        cmds.skinCluster(skin_cluster, e=True, useGeometry=True, addInfluence=others, wt=0.0)
+    return skin_cluster
+
+
+def write_weights(geo, skin_weights, skin_cluster, vertices=None):
+    """
+    Writes the whole weight matrix into the skinCluster with MFnSkinCluster.setWeights
+    (one call, or one per block of CHUNK_SIZE weights on very dense meshes).
+    Rows of a copy are normalized before writing, so the cluster does not have to do it.
+    :param vertices: mesh vertex indices of the rows for a partial write (see SkinWeights.take), the other
+                     vertices and the skinning method of the cluster are left untouched
+    """
+    skin_fn = get_skin_fn(skin_cluster)
+    shape_path = get_shape_path(geo)
+
+    cluster_indices = dict()
+    influence_paths = skin_fn.influenceObjects()
+    for i, path in enumerate(influence_paths):
+        cluster_indices[path.partialPathName()] = i
+        cluster_indices[path.fullPathName()] = i
+    indices = [cluster_indices[x] for x in skin_weights.influences]
+    # influences of the cluster that are not saved get zero weights instead of keeping the old ones
+    others = [x.partialPathName() for i, x in enumerate(influence_paths) if i not in indices]
+    # a copy is normalized: the weights of the caller (a shared transfer source) are left as they are
+    skin_weights = skin_weights.remap(skin_weights.influences + others)
+    indices += [cluster_indices[x] for x in others]
+
+    skin_weights.normalize(fallback_influence=indices.index(0) if 0 in indices else 0)
+
+    if vertices is not None:
+        if len(vertices) != skin_weights.vertex_count:
+            raise ValueError('%d rows for %d vertices' % (skin_weights.vertex_count, len(vertices)))
+        if not shape_path.hasFn(om2.MFn.kMesh):
+            raise RuntimeError('Partial weight writes are supported on meshes only: ' + geo)
+
+    # the sparse rows are expanded in blocks to keep the dense buffer small on heavy meshes
+    if vertices is not None or (shape_path.hasFn(om2.MFn.kMesh) and
+                                skin_weights.vertex_count > CHUNK_SIZE // max(len(indices), 1)):
+        rows = vertices if vertices is not None else range(skin_weights.vertex_count)
+        step = max(CHUNK_SIZE // max(len(indices), 1), 1)
+        for start in range(0, skin_weights.vertex_count, step):
+            end = min(start + step, skin_weights.vertex_count)
+            skin_fn.setWeights(shape_path, vertex_component(list(rows[start:end])), om2.MIntArray(indices),
+                               om2.MDoubleArray(skin_weights.dense(start, end)), False)
+    else:
+        skin_fn.setWeights(shape_path, get_complete_component(shape_path), om2.MIntArray(indices),
+                           om2.MDoubleArray(skin_weights.dense()), False)
+
+    if vertices is not None:
+        for vertex, value in zip(vertices, skin_weights.blend_weights):
+            cmds.setAttr('%s.bw[%d]' % (skin_cluster, vertex), value)
+        return
+    cmds.setAttr(skin_cluster + ".skinningMethod", skin_weights.skinning_method)
+    if skin_weights.blend_weights:
+        blend = skin_weights.blend_weights
+        cmds.setAttr(skin_cluster + '.bw[0:' + str(len(blend) - 1) + ']', *blend)
+
+
+def add_influences(skin_cluster, influences, scene_names=None):
+    """
+    Adds the influences the skinCluster does not have yet, with zero weights
+    :return: the added influences
+    """
+    existing = set()
+    for path in get_skin_fn(skin_cluster).influenceObjects():
+        existing.update((path.partialPathName(), path.fullPathName()))
+    missing = [x for x in influences if x not in existing]
+    if not missing:
+        return missing
+    scene_names = scene_names or SceneNames(missing)
+    joints = [x for x in missing if scene_names.node_type(x) == 'joint']
+    others = [x for x in missing if x not in joints]
+    if joints:
+        cmds.skinCluster(skin_cluster, e=True, addInfluence=joints, wt=0.0, lockWeights=False)
+    if others:
+        cmds.setAttr(skin_cluster + ".useComponents", 1)
+        cmds.skinCluster(skin_cluster, e=True, useGeometry=True, addInfluence=others, wt=0.0)
+    return missing
+
+
+def apply_weights(geo, skin_weights, scene_names=None, rebind=False, vertices=None):
+    """
+    Writes all the weights at once. An existing skinCluster is kept (its history and bind pose stay untouched),
+    only the influences it lacks are added; geometry without a skinCluster is bound to the saved influences.
+    :param scene_names: SceneNames already resolved for the influences
+    :param rebind: unbind the existing skinCluster and bind a new one
+    :param vertices: write only the rows of these vertices, skin_weights holds one row per given vertex
+    :return: skinCluster name
+    """
+    if rebind and vertices is not None:
+        raise ValueError('A partial weight write can not rebind the skinCluster')
+    skin_cluster = get_skin_cluster(geo)
+    if skin_cluster and rebind:
+        cmds.skinCluster(skin_cluster, e=True, unbind=True)
+        skin_cluster = None
+    if skin_cluster:
+        add_influences(skin_cluster, skin_weights.influences, scene_names)
+    else:
+        skin_cluster = bind(geo, skin_weights.influences, scene_names)
+    write_weights(geo, skin_weights, skin_cluster, vertices)
+    return skin_cluster
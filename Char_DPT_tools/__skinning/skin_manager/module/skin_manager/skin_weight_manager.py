@@ -1,26 +1,48 @@
 # -*- coding: utf-8 -*-
-import copy
-import json
 import math
+import os
 import re
-from pprint import pprint
-from random import random, uniform
+import time
+from collections import OrderedDict
+from random import random
 
 from PySide2.QtWidgets import QMainWindow, QMenuBar, QMenu, QAction, QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, \
-    QGroupBox, QButtonGroup, QPushButton, QLabel, QProgressBar, QLineEdit, QGridLayout, QDialog, QScrollArea
+    QGroupBox, QButtonGroup, QPushButton, QLabel, QProgressBar, QLineEdit, QGridLayout, QDialog, QScrollArea, \
+    QComboBox, QInputDialog, QCheckBox, QSpinBox, QDoubleSpinBox, QTableWidget, QTableWidgetItem, QHeaderView
 
 from PySide2.QtCore import Qt, QSettings
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin  # for parent ui to maya
 import maya.cmds as cmds
 import maya.OpenMaya as om
+import maya.api.OpenMaya as om2
 import maya.mel as mm
 
+from skin_engine import read_weights, apply_weights, write_weights, get_skin_cluster, get_world_positions, \
+    mesh_fingerprint, get_topology, get_shape_path, get_rest_points, selected_vertices, \
+    read_scene_weights, SceneNames
+from skin_weights import SkinWeights
+from components import ComponentSet
+from name_mapping import NameMapping, read_presets, write_presets, match_influences
+import weight_file
+import audit
+from transfer import TransferSource, UVSource, transfer_weights
+from topology import match_vertices, AmbiguousMatch
+from point_remap import remap_weights
+from mirror import pair_influences, mirror_weights, SymmetryCache
+from spatial import clusters
+
 
 PFX_PATTERN = '^(L_|R_|l_|r_|left_|right_|Left_|Right_)'
 DIGIT_PATTERN = r'\d{1,}$'
-AUXILIARY_ATTRIBUTES = ["paint_weights", "skinningMethod"]
+SETTINGS = ("Char_DPT_tools", "skin_weight_manager")
+PRESETS_FILE = "skin_name_mapping_presets.json"
+SYMMETRY_DIR = "skin_symmetry_maps"
+PRESET_KEY = "name_mapping_preset"
+NO_PRESET = "<none>"
+SUGGESTION_STYLE = "QLineEdit { background-color: rgb(95, 85, 40) }"
 
 ABOUT_PROGRAM = "\nLatest updates:                                   \n" \
+                "18.10.2026    -added binary weight files (.skw)     \n" \
                 "25.10.2024    -added dialog for missing objects     \n" \
                 "17.04.2024    -update save_skin function            \n" \
                 "23.05.2021    -added Switch geometry tool           \n" \
@@ -34,14 +56,25 @@ HELP_TEXT = """
             \n1 Save/Load skining:
             \n- The save weights button saves the skin weights of all selected objects.
             \n- The load weights button sets the weights of the objects saved in the corresponding file (highlighting is not necessary
+            \n- If some of the geometries from the file are selected, only their weights are loaded
+            \n- The selected name mapping preset (namespace, regex rules and name pairs) is applied before the missing objects are searched. Presets are saved from the name mapping dialog and are stored in the project folder
+            \n- With "Auto match" on, missing influences are matched to scene joints found at their saved position (and by name similarity). Only uncertain matches are shown in the dialog, highlighted
+            \n- Weights are saved in the binary .skw format, choose the .dat extension to save the old json format
+            \n- Loaded weights are written into the existing skinCluster (missing influences are added), turn on "Rebind on load" to build a new one
+            \n- With "Load onto selected vertices only" on, only the rows of the selected vertices are written
+            \n- With "Save vertex positions" on, the file can be loaded onto a mesh with another topology: the weights are remapped from the saved positions. Positions are taken in the bind pose, the pose of the rig when saving or loading does not matter
+            \n- "Prune weights" keeps the largest weights of every vertex (up to "Max influences"), drops weights below "Min weight" and renormalizes the changed vertices. It is applied to the weights that are saved, loaded or copied, the number of changed vertices is reported
             \n\n2 Copy weights to selected vertex:
             \n- Specify the copy source using the "Add Selected" button. After that, select the necessary vertices to which you want to copy the weight and click the "Copy weights to vertex" button
             \n\n3 Copy weights:
             \n- To copy from several objects, select all objects from which the weights will be copied. Select the target object last
             \n- To copy weights to several objects, first select the object from which weights will be copied, then all objects to which weights will be copied and click "Copy weights"
+            \n- With "In UV space" on, vertices are matched by their uvs (current uv set) instead of world positions, useful for garments that do not follow the body shape
             \n\n4 Other Char_DPT_tools:
             \n- "Flood shell" allows you to fill the weight of the selected joint with a geometric object inside the combined geometry. To do this, select the desired joint, then one of the object's vertices
             \n- "Select skin joints" selects all joints from the skin cluster of the selected geometry
+            \n- "Select off-center vertices" selects the vertices of the selected mesh that are not on the mirror plane (X = 0 in the bind pose)
+            \n- "Skin audit" reads every skinCluster of the scene and lists unnormalized vertices, vertices over "Max influences", weights below "Min weight" and unused influences per geometry. Click a column to sort, double click a line to select the geometry, the report can be exported as json or csv
             """
 
 
@@ -71,7 +104,9 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
 
         # ______________________ save / load
         self.save_load_box = QGroupBox("Save/Load skining:")
-        self.save_load_box_layout = QHBoxLayout(self.save_load_box)
+        self.save_load_v_layout = QVBoxLayout(self.save_load_box)
+        self.save_load_box_layout = QHBoxLayout()
+        self.save_load_v_layout.addLayout(self.save_load_box_layout)
         self.save_button = QPushButton('Save skin weight')
         self.save_load_box_layout.addWidget(self.save_button)
 
@@ -87,6 +122,49 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
 
         self.load_button.clicked.connect(self.load_skin)
 
+        preset_h_layout = QHBoxLayout()
+        self.preset_label = QLabel("Name mapping preset:")
+        self.preset_combo = QComboBox()
+        self.update_presets()
+        self.preset_combo.currentIndexChanged.connect(self.preset_changed)
+        preset_h_layout.addWidget(self.preset_label)
+        preset_h_layout.addWidget(self.preset_combo, 1)
+        self.save_load_v_layout.addLayout(preset_h_layout)
+
+        self.auto_match_check = QCheckBox("Auto match missing influences by position and name")
+        self.auto_match_check.setChecked(True)
+        self.save_load_v_layout.addWidget(self.auto_match_check)
+
+        self.store_points_check = QCheckBox("Save vertex positions (to load onto changed topology)")
+        self.save_load_v_layout.addWidget(self.store_points_check)
+
+        self.rebind_check = QCheckBox("Rebind on load (otherwise weights are written into the existing skinCluster)")
+        self.save_load_v_layout.addWidget(self.rebind_check)
+
+        self.to_selection_check = QCheckBox("Load onto selected vertices only")
+        self.save_load_v_layout.addWidget(self.to_selection_check)
+
+        # ______________________ pruning
+        self.prune_box = QGroupBox("Prune weights:")
+        self.prune_box_layout = QHBoxLayout(self.prune_box)
+        self.layout.addWidget(self.prune_box)
+
+        self.prune_save_check = QCheckBox("On save")
+        self.prune_load_check = QCheckBox("On load")
+        self.prune_copy_check = QCheckBox("On copy")
+        self.max_influences_spin = QSpinBox()
+        self.max_influences_spin.setRange(0, 32)
+        self.max_influences_spin.setValue(4)
+        self.max_influences_spin.setSpecialValueText("no limit")
+        self.min_weight_spin = QDoubleSpinBox()
+        self.min_weight_spin.setDecimals(4)
+        self.min_weight_spin.setRange(0.0, 0.5)
+        self.min_weight_spin.setSingleStep(0.001)
+        self.min_weight_spin.setValue(0.001)
+        for each in (self.prune_save_check, self.prune_load_check, self.prune_copy_check,
+                     QLabel("Max influences:"), self.max_influences_spin, QLabel("Min weight:"), self.min_weight_spin):
+            self.prune_box_layout.addWidget(each)
+
         # ______________________ copy_to_vertex
 
         self.to_vertex_box = QGroupBox("Copy weights to selected vertex:")
@@ -118,6 +196,8 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
         self.copy_box_layout.addWidget(self.copy_weights_button)
         self.copy_several_button.clicked.connect(self.copy_from_objects)
         self.copy_weights_button.clicked.connect(self.copy_skin)
+        self.uv_space_check = QCheckBox("In UV space")
+        self.copy_box_layout.addWidget(self.uv_space_check)
 
         # ______________________  other Char_DPT_tools
         self.other_box = QGroupBox("Other Char_DPT_tools:")
@@ -140,6 +220,14 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
         self.other_box_layout.addWidget(self.reskin_geometry_button, 1, 1)
         self.reskin_geometry_button.clicked.connect(self.reskin)
 
+        self.audit_button = QPushButton('Skin audit')
+        self.other_box_layout.addWidget(self.audit_button, 2, 0)
+        self.audit_button.clicked.connect(self.skin_audit)
+
+        self.off_center_button = QPushButton('Select off-center vertices')
+        self.other_box_layout.addWidget(self.off_center_button, 2, 1)
+        self.off_center_button.clicked.connect(self.select_off_center_command)
+
         self.setFixedWidth(600)
 
     @staticmethod
@@ -162,26 +250,62 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
     def ___________________________(self):
         pass
 
+    @staticmethod
+    def presets_path():
+        """
+        Name mapping presets are kept in the root of the current project, so every show has its own
+        """
+        return os.path.join(cmds.workspace(q=True, rd=True), PRESETS_FILE)
+
+    def update_presets(self, current=None):
+        """
+        Refills the preset list, the last used preset stays selected
+        """
+        current = current or QSettings(*SETTINGS).value(PRESET_KEY, NO_PRESET)
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItems([NO_PRESET] + list(read_presets(self.presets_path())))
+        index = self.preset_combo.findText(current)
+        self.preset_combo.setCurrentIndex(max(index, 0))
+        self.preset_combo.blockSignals(False)
+
+    def preset_changed(self):
+        QSettings(*SETTINGS).setValue(PRESET_KEY, self.preset_combo.currentText())
+
+    def current_mapping(self):
+        """
+        :return: NameMapping of the selected preset (an empty one if no preset is selected)
+        """
+        presets = read_presets(self.presets_path())
+        name = self.preset_combo.currentText()
+        return NameMapping.from_dict(presets[name]) if name in presets else NameMapping()
+
+    def pruning(self, check):
+        """
+        :param check: the "On save", "On load" or "On copy" checkbox
+        :return: (max influences, min weight) when pruning is on for that stage, otherwise None
+        """
+        if not check.isChecked():
+            return None
+        return self.max_influences_spin.value(), self.min_weight_spin.value()
+
     def load_blend_weights(self):
 
         vDir = cmds.workspace(q=True, rd=True)
-        file_path = cmds.fileDialog2(fileFilter='*.dat', fileMode=1, caption="Save position", dir=vDir)
+        file_path = cmds.fileDialog2(fileFilter=weight_file.FILE_FILTER, fileMode=1, caption="Save position", dir=vDir)
 
         if not file_path:
             om.MGlobal.displayError('Canceling a save')
             return False
 
-        with open(file_path[0], "r") as file:
-            data = json.load(file)[0]
+        data = weight_file.read(file_path[0])
 
         for geo in data.keys():
-            weight = data[geo]
-            bland_attr = weight.pop("paint_weights")
-            skinning_method = weight.pop("skinningMethod")
             skin_cluster = Skin.get_skin_claster(geo)
-            cmds.setAttr(skin_cluster + ".skinningMethod", skinning_method)
-            for i, each in enumerate(bland_attr):
-                cmds.setAttr(skin_cluster + '.bw[' + str(i) + ']', each)
+            cmds.setAttr(skin_cluster + ".skinningMethod", data[geo].skinning_method)
+            bland_attr = data[geo].blend_weights
+            if bland_attr:
+                cmds.setAttr(skin_cluster + '.bw[0:' + str(len(bland_attr) - 1) + ']', *bland_attr)
 
         om.MGlobal.displayInfo('Weights successfully loaded!')
 
@@ -190,49 +314,164 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
     def load_skin(self):
 
         vDir = cmds.workspace(q=True, rd=True)
-        file_path = cmds.fileDialog2(fileFilter='*.dat', fileMode=1, caption="Save position", dir=vDir)
+        file_path = cmds.fileDialog2(fileFilter=weight_file.FILE_FILTER, fileMode=1, caption="Save position", dir=vDir)
 
         if not file_path:
             om.MGlobal.displayError('Canceling a save')
             return False
 
-        with open(file_path[0], "r") as file:
-            data = json.load(file)[0]
+        vertices = None
+        if self.to_selection_check.isChecked():
+            vertices = selected_vertices(cmds.ls(sl=True))
+            if not vertices:
+                om.MGlobal.displayError('Select the vertices to load the weights onto')
+                return False
+
+        # only the header is read here, weights are decoded when it is clear where they go
+        with weight_file.WeightArchive(file_path[0]) as archive:
+            if vertices is not None:
+                vertices = OrderedDict((x, vertices[x].indices()) for x in vertices if x in archive)
+                selected = list(vertices)
+                if not selected:
+                    om.MGlobal.displayError('None of the selected meshes is saved in the file')
+                    return False
+            else:
+                selected = [x for x in cmds.ls(sl=True, transforms=True) if x in archive]
+            influences = OrderedDict((x, archive.geometries[x]['influences']) for x in selected or archive.names())
+            mapping = self.current_mapping()
+            names, scene_names = self.resolve_names(influences, mapping)
+            missing = [x for x in names if not scene_names.exists(names[x])]
+
+            suggestions = dict()
+            if missing and self.auto_match_check.isChecked():
+                positions = dict()
+                for geo in influences:
+                    positions.update(archive.geometries[geo].get('influence_positions') or dict())
+                suggestions = self.auto_match([x for x in missing if x not in influences], positions,
+                                              names, scene_names)
+                applied = sorted((name, target) for name, (target, confident) in suggestions.items() if confident)
+                for name, target in applied:
+                    mapping.set_pair(name, target)
+                if applied:
+                    # a wrong position or name match has to be noticed, the weights are applied without a dialog
+                    om.MGlobal.displayWarning('Missing influences matched by position and name: ' +
+                                              ', '.join(name + ' -> ' + target for name, target in applied))
+                names, scene_names = self.resolve_names(influences, mapping)
+                missing = [x for x in names if not scene_names.exists(names[x])]
+
+            if not missing:
+                self.load_weights(archive, influences, names, scene_names, self.rebind_check.isChecked(), vertices,
+                                  self.pruning(self.prune_load_check))
+                om.MGlobal.displayInfo('Weights successfully loaded!')
+                return
+
+        self.dialog = ReplaceDialog(file_path[0], influences, mapping, self, suggestions=suggestions,
+                                    rebind=self.rebind_check.isChecked(), vertices=vertices,
+                                    pruning=self.pruning(self.prune_load_check))
+        self.dialog.setWindowFlags(self.dialog.windowFlags() | Qt.WindowStaysOnTopHint)
+        self.dialog.show()
 
-        if self.get_missing_objects(data):
-            self.dialog = ReplaceDialog(data, self)
-            self.dialog.setWindowFlags(self.dialog.windowFlags() | Qt.WindowStaysOnTopHint)
-            self.dialog.show()
-        else:
-            for geo in data.keys():
-                Skin.set_weight(geo, data[geo])
-            om.MGlobal.displayInfo('Weights successfully loaded!')
+    @staticmethod
+    def auto_match(missing, positions, names, scene_names):
+        """
+        Looks for scene joints that can replace missing influences, joints already used by the file are skipped
+        :param positions: {saved influence: world position} from the weight file
+        :return: {missing name: (scene joint, confident)}
+        """
+        used = set(names[x] for x in names if scene_names.exists(names[x]))
+        scene_positions = get_world_positions([x for x in cmds.ls(type='joint') if x not in used])
+        return match_influences(missing, positions, scene_positions)
+
+    @staticmethod
+    def load_weights(archive, geometries, names, scene_names, rebind=False, vertices=None, pruning=None):
+        """
+        Decodes geometries from the archive and applies them under their scene names.
+        Saved influences mapped to the same scene influence are merged into one column, their weights are summed.
+        :param names: {saved name: scene name}
+        :param rebind: replace existing skinClusters instead of writing into them
+        :param vertices: {saved geometry: [vertex indices]} to write only the rows of these vertices
+        :param pruning: (max influences, min weight) to prune the weights before they are written
+        """
+        for geo in geometries:
+            skin_weights = archive.read(geo)
+            targets = list(OrderedDict.fromkeys(names[x] for x in skin_weights.influences))
+            if len(targets) < skin_weights.influence_count:
+                om.MGlobal.displayWarning('Several influences of "' + geo + '" are mapped to the same scene object, '
+                                          'their weights are added together')
+            skin_weights = skin_weights.remap(targets, names)
+            topology = mesh_fingerprint(names[geo])
+            if skin_weights.topology and topology and skin_weights.topology != topology:
+                skin_weights = SkinWeightManager.fit_to_mesh(names[geo], skin_weights)
+            if vertices is not None:
+                if any(x >= skin_weights.vertex_count for x in vertices[geo]):
+                    om.MGlobal.displayError('Selected vertices of "' + names[geo] + '" are outside the saved '
+                                            'weights (' + str(skin_weights.vertex_count) + ' vertices), '
+                                            'it is skipped')
+                    continue
+                block = Skin.prune(names[geo], skin_weights.take(vertices[geo]), pruning)
+                apply_weights(names[geo], block, scene_names, vertices=vertices[geo])
+            else:
+                Skin.set_weight(names[geo], Skin.prune(names[geo], skin_weights, pruning), scene_names, rebind)
 
-    def save_skin(recordNod=''):
+    @staticmethod
+    def fit_to_mesh(geo, skin_weights):
+        """
+        Adapts saved weights to a scene mesh whose topology differs from the saved one: the rows are reordered
+        when only the vertex order changed, otherwise they are remapped by the saved vertex positions
+        :return: SkinWeights for the vertices of the scene mesh
+        """
+        shape_path = get_shape_path(geo)
+        order = None
+        if skin_weights.connectivity:
+            saved = (skin_weights.vertex_count,) + tuple(skin_weights.connectivity)
+            # saved positions tell a symmetric (mirrored or rotated) match from the true one
+            points = (skin_weights.points, get_rest_points(geo)) if skin_weights.points else None
+            try:
+                order = match_vertices(saved, get_topology(shape_path), points=points)
+            except AmbiguousMatch:
+                om.MGlobal.displayWarning('The vertex order of "' + geo + '" was changed and its topology is '
+                                          'symmetric, it can not be matched without saved vertex positions. '
+                                          'Weights are applied by vertex index')
+                return skin_weights
+        if order is not None:
+            om.MGlobal.displayInfo('The vertex order of "' + geo + '" was changed, the saved weights are reordered')
+            return skin_weights.reorder(order)
+        if skin_weights.points:
+            # both sides in the bind pose: saved from a posed rig or loaded onto one, the shapes still match
+            points = get_rest_points(geo)
+            om.MGlobal.displayInfo('The topology of "' + geo + '" was changed, the weights are remapped '
+                                   'by the saved vertex positions')
+            return remap_weights(skin_weights, [points[i:i + 3] for i in range(0, len(points), 3)])
+        om.MGlobal.displayWarning('The topology of "' + geo + '" differs from the saved one, '
+                                  'weights are applied by vertex index')
+        return skin_weights
+
+    def save_skin(self):
         """
         Saves the skin weights of selected polygon objects onto a data object that can be loaded later.
+        Files with the '.dat' extension are written in the legacy json format.
         """
         listGeo = cmds.ls(sl=True)
-        dataList = {}
+        dataList = OrderedDict()
         vDir = cmds.workspace(q=True, rd=True)
-        file_path = cmds.fileDialog2(fileFilter='*.dat', fileMode=0, caption="Save position", dir=vDir)
+        file_filter = 'Skin weights (*' + weight_file.BINARY_EXTENSION + ');;' \
+                      'Legacy json (*' + weight_file.LEGACY_EXTENSION + ')'
+        file_path = cmds.fileDialog2(fileFilter=file_filter, fileMode=0, caption="Save position", dir=vDir)
 
         if not file_path:
             om.MGlobal.displayError('Canceling a save')
             return False
 
         if listGeo:
-            # cmds.progressWindow(title='Save skin', progress=0, status='', isInterruptable=True)
-            # i = 0
             for geo in listGeo:
-                # i += 100 / max(len(listGeo), 1)
-                # cmds.progressWindow(edit=True, progress=min(i, 100), status='')
-                dataList[geo] = Skin.get_weight(geo)
+                dataList[geo] = Skin.prune(geo, Skin.read(geo, self.store_points_check.isChecked()),
+                                           self.pruning(self.prune_save_check))
 
-            with open(file_path[0], "w") as file:
-                json.dump([dataList, ], file, indent=4)
+            if file_path[0].lower().endswith(weight_file.LEGACY_EXTENSION):
+                weight_file.write_legacy(file_path[0], dataList)
+            else:
+                weight_file.write(file_path[0], dataList)
 
-            # cmds.progressWindow(endProgress=1)
             om.MGlobal.displayInfo('Weights successfully saved!')
         else:
             om.MGlobal.displayError('One or more polygon objects must be selected!')
@@ -243,44 +482,36 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
         """
         try:
             sourceObj = self.to_vertex_h_line_edit.text()
-            destVert = Utilities.convert_slice_to_list(cmds.ls(sl=True))
-            Skin.copy_to_sel_vertex(sourceObj, destVert)
+            for destVert in selected_vertices(cmds.ls(sl=True)).values():
+                Skin.copy_to_sel_vertex(sourceObj, destVert, self.pruning(self.prune_copy_check))
             om.MGlobal.displayInfo('Weights successfully copied!')
         except Exception as message:
             om.MGlobal.displayError(message)
 
-    @staticmethod
-    def copy_from_objects():
+    def copy_from_objects(self):
         """
         This function copies skin weights from a source geometry objects to a target geometry.
         """
         try:
             sGeo = cmds.ls(sl=True)[:-1]
             geo = cmds.ls(sl=True)[-1]
-            if cmds.ls(cmds.listHistory(geo), type='skinCluster'):
-                skCluster = cmds.ls(cmds.listHistory(geo), type='skinCluster')[0]
-                cmds.skinCluster(skCluster, e=True, ub=True)
-            jntList = []
-            for each in sGeo:
-                skinCluster = cmds.ls(cmds.listHistory(each), type='skinCluster')[0]
-                jnts = cmds.ls(cmds.listHistory(skinCluster, levels=1), type='transform')
-                for jnt in jnts:
-                    if jnt not in jntList:
-                        jntList.append(jnt)
-            cmds.skinCluster(jntList, geo, tsb=True, normalizeWeights=True)
-            cmds.select(sGeo + [geo])
-            cmds.copySkinWeights(noMirror=True, surfaceAssociation='closestPoint', influenceAssociation='oneToOne')
+            uv_space = self.uv_space_check.isChecked()
+            source_type = UVSource if uv_space else TransferSource
+            skin_weights = transfer_weights([source_type(x) for x in sGeo], geo, uv_space=uv_space)
+            apply_weights(geo, Skin.prune(geo, skin_weights, self.pruning(self.prune_copy_check)))
             om.MGlobal.displayInfo('Weights successfully copied!')
         except Exception as message:
             om.MGlobal.displayError(message)
 
-    @staticmethod
-    def copy_skin():
+    def copy_skin(self):
         """Copying weights from the first selected object to the rest"""
         try:
             lst = cmds.ls(sl=True)
+            uv_space = self.uv_space_check.isChecked()
+            # the source is read and indexed once for all targets
+            source = UVSource(lst[0]) if uv_space else TransferSource(lst[0])
             for geo in lst[1:]:
-                Skin.copy(lst[0], geo)
+                Skin.copy(lst[0], geo, source, uv_space, self.pruning(self.prune_copy_check))
                 om.MGlobal.displayInfo('Weights successfully copied to "' + geo + '"!')
         except Exception as message:
             om.MGlobal.displayError(message)
@@ -289,42 +520,15 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
     def flood_shell():
         """
         Allows you to fill the weight of the selected joint with a geometric object inside the combined geometry.
-        To do this, select the desired joint, then one of the object's vertices
+        To do this, select the desired joint, then one of the object's vertices.
+        Only the rows of the shell vertices are written.
         """
         mm.eval('polyConvertToShell;')
         sel = cmds.ls(sl=True)
         joint = [x for x in sel if cmds.nodeType(x) == "joint"][0]
-        # get face if it exist
-        selFaces = cmds.filterExpand(sm=34)
-        if selFaces:
-            sel_vertexees = Utilities.convert_slice_to_list(cmds.polyListComponentConversion(selFaces, tv=True))
-        else:
-            sel_vertexees = [x for x in sel if not cmds.nodeType(x) == "joint"]
-        vertexees = []
-        while sel_vertexees:
-            node = sel_vertexees.pop()
-            vertex = Utilities.convert_slice_to_list([node])
-            vertexees += vertex
-
-        geo = vertexees[0].split(".vtx")[0]
-        weight = Skin.get_weight(geo)
-
-        pointNumber = len(vertexees)
-        if not joint in weight.keys():
-            weight[joint] = [0 for x in range(pointNumber)]
-        vertex_indexes = [int(x.split(".vtx[")[-1][:-1]) for x in vertexees]
-
-        for jnt in weight.keys():
-            if jnt not in AUXILIARY_ATTRIBUTES:
-                if jnt == joint:
-                    for i in vertex_indexes:
-                        weight[jnt][i] = 1.0
-                else:
-                    for i in vertex_indexes:
-                        weight[jnt][i] = 0.0
-
-        Skin.set_weight(geo, weight)
-        pprint(weight)
+        for geo, vertices in selected_vertices([x for x in sel if x != joint]).items():
+            shell = SkinWeights.from_dense([joint], len(vertices), [1.0] * len(vertices))
+            apply_weights(geo, shell, vertices=vertices.indices())
 
     @staticmethod
     def selekt_skin_jnts():
@@ -334,6 +538,15 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
         cmds.select(jointName)
         return jointName
 
+    @staticmethod
+    def select_off_center_command():
+        """
+        Selects the vertices of the selected mesh that are not on the mirror plane (its bind pose is used)
+        """
+        selection = cmds.ls(sl=True, objectsOnly=True)
+        if selection:
+            Mirror.select_off_center_vertices(selection[0])
+
     @staticmethod
     def mirror_command():
         selection = cmds.ls(sl=True)
@@ -341,40 +554,72 @@ class SkinWeightManager(MayaQWidgetBaseMixin, QMainWindow):
             Mirror(selection[0]).mirror()
         cmds.select(selection)
 
+    def skin_audit(self):
+        """
+        Audit of all skinned geometries with the limits of the prune settings
+        """
+        self.audit_dialog = AuditDialog(self.max_influences_spin.value(), self.min_weight_spin.value(), self)
+        self.audit_dialog.show()
+
     @staticmethod
     def reskin(objectName=None):
         if not objectName:
             objectName = cmds.ls(sl=True)[0]
-        weightList = Skin.get_weight(objectName)
-        skinClusterName = cmds.ls(cmds.listHistory(objectName, pdo=1), type='skinCluster')[0]
-        cmds.skinCluster(skinClusterName, e=True, ub=True)
-        Skin.set_weight(objectName, weightList)
+        Skin.set_weight(objectName, Skin.read(objectName), rebind=True)
         om.MGlobal.displayInfo('Weights successfully saved!')
 
     @staticmethod
-    def get_missing_objects(data):
+    def resolve_names(influences, mapping=None):
         """
-        Finds objects from the dictionary with weights that are not present in the scene
+        Translates saved names with the mapping and checks all candidates with one scene query.
+        A name keeps its saved form when only that one is in the scene.
+        :param influences: {saved geometry: [saved influence names]}
+        :return: {saved name: scene name}, SceneNames
         """
-        missing_objects = set()
-        for geo_dict in data:
-            for joint in data[geo_dict]:
-                if cmds.objExists(joint) or joint in AUXILIARY_ATTRIBUTES:
-                    continue
-                missing_objects.add(joint)
-
-            if cmds.objExists(geo_dict):
-                continue
-            missing_objects.add(geo_dict)
+        mapping = mapping or NameMapping()
+        saved = set(influences)
+        for geo in influences:
+            saved.update(influences[geo])
+        scene_names = SceneNames([x for name in saved for x in mapping.candidates(name)])
+
+        names = dict()
+        for name in saved:
+            candidates = mapping.candidates(name)
+            names[name] = ([x for x in candidates if scene_names.exists(x)] or candidates)[0]
+        return names, scene_names
 
-        return list(missing_objects)
+    @staticmethod
+    def get_missing_objects(influences, mapping=None):
+        """
+        Finds geometries and influences that are not present in the scene
+        :param influences: {geometry: [influence names]}
+        :return: saved names that could not be resolved
+        """
+        names, scene_names = SkinWeightManager.resolve_names(influences, mapping)
+        return [x for x in names if not scene_names.exists(names[x])]
 
 
 class ReplaceDialog(QDialog):
-    def __init__(self, data, parent=None):
+    def __init__(self, file_path, influences, mapping=None, parent=None, suggestions=None, rebind=False,
+                 vertices=None, pruning=None):
+        """
+        :param file_path: weight file, it is decoded only when the mapping is applied
+        :param influences: {geometry: [influence names]} taken from the file header
+        :param mapping: NameMapping the rules of the dialog are added to
+        :param suggestions: {missing name: (scene name, confident)} from the auto match, shown for confirmation
+        :param rebind: replace existing skinClusters when the weights are applied
+        :param vertices: {geometry: [vertex indices]} when only the selected vertices are loaded
+        :param pruning: (max influences, min weight) applied to the loaded weights
+        """
         super(ReplaceDialog, self).__init__(parent)
+        self.rebind = rebind
+        self.vertices = vertices
+        self.pruning = pruning
         self.item_list = list()
-        self.data = data
+        self.suggestions = suggestions or dict()
+        self.file_path = file_path
+        self.influences = influences
+        self.mapping = mapping or NameMapping()
 
         self.setWindowTitle('Set up name mapping')
 
@@ -401,6 +646,20 @@ class ReplaceDialog(QDialog):
         self.namespace_butten_add.clicked.connect(self.edit_namespace_add)
         self.namespace_butten_sub.clicked.connect(self.edit_namespace_sub)
 
+        # _________________________________ regex replace
+        # creation
+        regex_layout = QHBoxLayout()
+        layout.insertLayout(1, regex_layout)
+        self.regex_label = QLabel('Search (regex): ')
+        self.regex_le = QLineEdit()
+        self.replace_le = QLineEdit()
+        self.regex_button = QPushButton('Replace')
+        # set location
+        for each in (self.regex_label, self.regex_le, QLabel('Replace: '), self.replace_le, self.regex_button):
+            regex_layout.addWidget(each)
+        # connection
+        self.regex_button.clicked.connect(self.edit_regex)
+
         # _________________________________ central layout for items
         # creation
         self.items_layout = QVBoxLayout()
@@ -422,40 +681,66 @@ class ReplaceDialog(QDialog):
         layout.addLayout(self.button_layout)
         # creation
         self.apply_button = QPushButton("Apply", self)
+        self.preset_button = QPushButton("Save as preset", self)
         self.cancel_button = QPushButton("Cancel", self)
         # set location
         self.button_layout.addWidget(self.apply_button)
+        self.button_layout.addWidget(self.preset_button)
         self.button_layout.addWidget(self.cancel_button)
         # connection
         self.apply_button.clicked.connect(self.accept)
+        self.preset_button.clicked.connect(self.save_preset)
         self.cancel_button.clicked.connect(self.reject)
 
         self.setLayout(layout)
 
     def accept(self):
-        missing_objects = self.get_data()
-        temp_data = copy.deepcopy(self.data)
+        self.update_pairs()
+        names, scene_names = SkinWeightManager.resolve_names(self.influences, self.mapping)
 
-        for geometry in temp_data:
-            for joint in temp_data[geometry]:
-                if joint in missing_objects.keys():
-                    jnt_data = temp_data[geometry].pop(joint)
-                    temp_data[geometry][missing_objects[joint]] = jnt_data
+        still_missing = [names[x] for x in names if not scene_names.exists(names[x])]
+        if still_missing:
+            error_text = 'The list still contains objects that are not in the scene: ' + ' '.join(still_missing)
+            om.MGlobal.displayError(error_text)
+            return
 
-            if geometry in missing_objects.keys():
-                geo_data = temp_data.pop(geometry)
-                temp_data[missing_objects[geometry]] = geo_data
+        with weight_file.WeightArchive(self.file_path) as archive:
+            SkinWeightManager.load_weights(archive, self.influences, names, scene_names, self.rebind,
+                                           self.vertices, self.pruning)
 
-        if not SkinWeightManager.get_missing_objects(temp_data):
-            for geometry in temp_data:
-                Skin.set_weight(geometry, temp_data[geometry])
+        om.MGlobal.displayInfo('Weights successfully edit and loaded!')
+        super(ReplaceDialog, self).accept()
 
-            om.MGlobal.displayInfo('Weights successfully edit and loaded!')
-            super(ReplaceDialog, self).accept()
-        else:
-            missing_objects = SkinWeightManager.get_missing_objects(temp_data)
-            error_text = 'The list still contains objects that are not in the scene: ' + ' '.join(missing_objects)
-            om.MGlobal.displayError(error_text)
+    def update_pairs(self):
+        """
+        Lines of the dialog become explicit pairs of the mapping
+        """
+        for name, new_name in self.get_data().items():
+            self.mapping.set_pair(name, new_name)
+
+    def save_preset(self):
+        """
+        Stores the rules and pairs of the dialog as a project preset and makes it the current one
+        """
+        name, ok = QInputDialog.getText(self, 'Save preset', 'Preset name:')
+        if not ok or not name:
+            return
+        self.update_pairs()
+        path = SkinWeightManager.presets_path()
+        presets = read_presets(path)
+        presets[name] = self.mapping.to_dict()
+        write_presets(path, presets)
+        QSettings(*SETTINGS).setValue(PRESET_KEY, name)
+        if isinstance(self.parent(), SkinWeightManager):
+            self.parent().update_presets(name)
+        om.MGlobal.displayInfo('Preset "' + name + '" saved to ' + path)
+
+    def apply_rule(self, rule):
+        """
+        Applies a compiled mapping rule to all lines
+        """
+        for item in self.item_list:
+            item.line_edit.setText(rule(item.line_edit.text()))
 
     def edit_namespace_add(self):
         """
@@ -465,11 +750,7 @@ class ReplaceDialog(QDialog):
         namespace = self.namespace_le.text()
         if not namespace:
             return
-        namespace = namespace + ':' if not namespace[-1] == ':' else namespace
-
-        for item in self.item_list:
-            new_name = namespace + item.line_edit.text()
-            item.line_edit.setText(new_name)
+        self.apply_rule(self.mapping.add_namespace(namespace))
 
     def edit_namespace_sub(self):
         """
@@ -478,20 +759,35 @@ class ReplaceDialog(QDialog):
         :return: pass
         """
         namespace = self.namespace_le.text()
-        pattern = r'^' + namespace + ':' if not namespace[-1] == ':' else r'^' + namespace
+        if not namespace:
+            return
+        self.apply_rule(self.mapping.remove_namespace(namespace))
 
-        for item in self.item_list:
-            new_name = re.sub(pattern, '', item.line_edit.text())
-            item.line_edit.setText(new_name)
+    def edit_regex(self):
+        """
+        Regular expression substitution in all lines
+        :return: pass
+        """
+        try:
+            rule = self.mapping.add_regex(self.regex_le.text(), self.replace_le.text())
+        except re.error as message:
+            om.MGlobal.displayError('Wrong regular expression: ' + str(message))
+            return
+        self.apply_rule(rule)
 
     def add_items(self):
         """
         Adds all objects according to the data
         :return: pass
         """
-        missing_objects = SkinWeightManager.get_missing_objects(self.data)
+        missing_objects = SkinWeightManager.get_missing_objects(self.influences, self.mapping)
         for name in missing_objects:
             items_widget = JointWidget(name)
+            items_widget.line_edit.setText(self.mapping.translate(name))
+            if name in self.suggestions:
+                items_widget.line_edit.setText(self.suggestions[name][0])
+                items_widget.line_edit.setStyleSheet(SUGGESTION_STYLE)
+                items_widget.line_edit.setToolTip('Suggested by position and name, please check')
             self.item_list.append(items_widget)
             self.inside_layout.addWidget(items_widget)
 
@@ -506,6 +802,80 @@ class ReplaceDialog(QDialog):
         return new_names_dict
 
 
+class AuditDialog(QDialog):
+    def __init__(self, max_influences=4, min_weight=0.001, parent=None):
+        """
+        Sortable table of the skin statistics of every skinned geometry in the scene
+        :param max_influences: influence limit per vertex, 0 for no limit
+        :param min_weight: weights below it are counted as near zero
+        """
+        super(AuditDialog, self).__init__(parent)
+        self.max_influences = max_influences
+        self.min_weight = min_weight
+        self.report = list()
+        self.setWindowTitle('Skin audit')
+        self.resize(900, 500)
+
+        layout = QVBoxLayout(self)
+        self.info_label = QLabel()
+        layout.addWidget(self.info_label)
+
+        self.table = QTableWidget(0, len(audit.COLUMNS))
+        self.table.setHorizontalHeaderLabels([x.replace('_', ' ') for x in audit.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.cellDoubleClicked.connect(self.select_geometry)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        layout.addLayout(button_layout)
+        self.refresh_button = QPushButton('Refresh')
+        self.json_button = QPushButton('Export json')
+        self.csv_button = QPushButton('Export csv')
+        for each in (self.refresh_button, self.json_button, self.csv_button):
+            button_layout.addWidget(each)
+        self.refresh_button.clicked.connect(self.refresh)
+        self.json_button.clicked.connect(lambda: self.export('Json (*.json)', audit.write_json))
+        self.csv_button.clicked.connect(lambda: self.export('Csv (*.csv)', audit.write_csv))
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reads all skinClusters at once and fills the table
+        """
+        start = time.time()
+        self.report = audit.audit(read_scene_weights(), self.max_influences, self.min_weight)
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(self.report))
+        for row, data in enumerate(self.report):
+            for column, key in enumerate(audit.COLUMNS):
+                value = data[key]
+                item = QTableWidgetItem()
+                if key == 'unused_influences':
+                    item.setData(Qt.DisplayRole, len(value))  # numbers sort numerically
+                    item.setToolTip('\n'.join(value))
+                else:
+                    item.setData(Qt.DisplayRole, value)
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+        self.info_label.setText('%d geometries audited in %.2f s (max influences: %s, min weight: %g)'
+                                % (len(self.report), time.time() - start, self.max_influences or 'no limit',
+                                   self.min_weight))
+
+    def select_geometry(self, row, column):
+        cmds.select(self.table.item(row, 0).text())
+
+    def export(self, file_filter, writer):
+        file_path = cmds.fileDialog2(fileFilter=file_filter, fileMode=0, caption="Export skin audit",
+                                     dir=cmds.workspace(q=True, rd=True))
+        if not file_path:
+            return
+        writer(file_path[0], self.report)
+        om.MGlobal.displayInfo('Skin audit exported to ' + file_path[0])
+
+
 class JointWidget(QWidget):
     def __init__(self, name, parent=None):
         super(JointWidget, self).__init__(parent)
@@ -537,168 +907,82 @@ class Skin:
 
     @staticmethod
     def get_weight(geo):
-        skinCluster = Skin.get_skin_claster(geo)
-        jnts = cmds.skinCluster(skinCluster, query=True, inf=True)
-        jnts = [jnt for jnt in jnts if not cmds.connectionInfo(jnt + '.worldInverseMatrix[0]', isSource=True)]
-        weight = {}
-        jointIndex, skinClusterIndex, skinClusterConnect, skinClusterConnectPart = [], '', '', ''  # get jnt index and weight
-        sizeArray = cmds.getAttr(geo + ".cp", size=True)
-        cmds.progressWindow(title='Save ' + geo + ' weights:', progress=0, status='Progress: 0%')
-        for i in xrange(len(jnts)):
-            cmds.progressWindow(edit=True, progress=int(len(jnts) * 0.01 * i))
-            skinClusterConnect = cmds.listConnections(jnts[i] + ".worldMatrix", type='skinCluster', plugs=True)
-            for skinClusterIndex in xrange(len(skinClusterConnect)):
-                skinClusterConnectPart = skinClusterConnect[skinClusterIndex].split("[")
-                if skinCluster + ".matrix" == skinClusterConnectPart[0]:
-                    break
-            jointIndex = skinClusterConnectPart[1][:-1]
-            weight[jnts[i]] = cmds.getAttr(
-                skinCluster + ".weightList[0:" + str(sizeArray - 1) + "].w[" + jointIndex + "]")
-        weight["skinningMethod"] = cmds.getAttr(skinCluster + ".skinningMethod")
-        weight["paint_weights"] = cmds.getAttr(skinCluster + ".paintWeights")  # cmds.getAttr(skinCluster+'.bw[%d]'%i)
-        cmds.progressWindow(endProgress=1)
-        return weight
+        """
+        Weights in the legacy dictionary form: {influence: [weight per vertex], "skinningMethod", "paint_weights"}
+        """
+        return Skin.read(geo).as_dict()
+
+    @staticmethod
+    def read(geo, with_points=False):
+        """
+        Reads all weights of the geometry with one API call
+        :param with_points: keep the vertex world positions of the bind pose too
+        :return: SkinWeights
+        """
+        return read_weights(geo, with_points)
+
+    @staticmethod
+    def set_weight(geo, weight, scene_names=None, rebind=False):
+        """
+        Sets all weights with one API call, into the existing skinCluster unless rebind is set
+        :param weight: SkinWeights or the legacy weight dictionary
+        :param scene_names: SceneNames resolved beforehand for the influences
+        :param rebind: replace the existing skinCluster with a new one
+        """
+        if isinstance(weight, dict):
+            weight = SkinWeights.from_dict(weight)
+        return apply_weights(geo, weight, scene_names, rebind)
 
     @staticmethod
-    def set_weight(geo, weight):
-        bland_attr = weight.pop("paint_weights")
-        skinning_method = weight.pop("skinningMethod")
-
-        if Skin.get_skin_claster(geo):  # unbind skin Cluster if it exists
-            skCluster = Skin.get_skin_claster(geo)
-            cmds.skinCluster(skCluster, e=True, unbind=True)
-        cmds.select(cl=True)
-
-        # sort	jnt forvard
-        jnt = [x for x in weight.keys() if cmds.objectType(x) == 'joint'] + [x for x in weight.keys() if
-                                                                             not cmds.objectType(x) == 'joint']
-        skCluster = cmds.skinCluster(jnt[0], geo, tsb=True, normalizeWeights=True)[0]  # skinning
-
-        useGeoFlag = True if [x for x in jnt if not cmds.objectType(x) == 'joint'] else False  # influense geo test
-        if useGeoFlag:  cmds.setAttr(skCluster + ".useComponents", 1)
-        cmds.skinCluster(skCluster, e=True, useGeometry=useGeoFlag, addInfluence=jnt[1:], wt=0.0)  # add influenses
-        pointsList = range(len(weight[jnt[0]]))  # point number list
-        jntAndPos = []  # joint and pos in claster list
-        for jn in jnt[1:]:
-            jntAndPos.append([jn,
-                              [x for x in cmds.connectionInfo(jn + '.worldMatrix[0]', dfs=True) if skCluster in x][
-                                  0].split(
-                                  ']')[0].split('[')[1]])  # get position in clasters jnt list
-
-        cmds.progressWindow(title='Save ' + geo + ' weights:', progress=0, status='Progress: 0%')
-        p = 0
-        for jn, pos in jntAndPos:  # go through all the joints except the first one and it positions in skin claster
-            cmds.progressWindow(edit=True, progress=int(len(jntAndPos) * 0.01 * p))
-            p += 1
-            for i in pointsList:  # go through all points for carrent joint
-                if weight[jn][i] > 0:  # if point weight larger than 0
-                    oldWeight = cmds.getAttr(
-                        skCluster + ".weightList[" + str(i) + "].w[0]")  # get point weight for first joint
-                    cmds.setAttr(skCluster + ".weightList[" + str(i) + "].w[0]",
-                                 oldWeight - weight[jn][i])  # correct and set point weight for first joint
-                    cmds.setAttr(skCluster + ".weightList[" + str(i) + "].w[" + pos + "]",
-                                 weight[jn][i])  # set point weight for carrent joint
-
-        # rebuilds dq weights
-        cmds.setAttr(skCluster + ".skinningMethod", skinning_method)
-        for i, each in enumerate(bland_attr):
-            cmds.setAttr(skCluster + '.bw[' + str(i) + ']', each)
-
-        cmds.progressWindow(endProgress=1)
-        return skCluster
+    def prune(geo, weight, pruning=None):
+        """
+        Prunes the weights in place and reports the number of changed vertices
+        :param pruning: (max influences, min weight), nothing is done when it is None
+        :return: the same SkinWeights
+        """
+        if pruning:
+            changed = weight.prune(*pruning)
+            om.MGlobal.displayInfo('"%s": %d of %d vertices pruned' % (geo, changed, weight.vertex_count))
+        return weight
 
     @staticmethod
     def get_skin_claster(geo):
-        skin_cluster = cmds.ls(cmds.listHistory(geo), type='skinCluster')
-        if not skin_cluster:
-            shape = cmds.listRelatives(geo, s=True)[0]
-            skin_cluster = cmds.ls(cmds.listHistory(shape), type='skinCluster')
-        if skin_cluster:
-            return skin_cluster[0]
-        else:
-            return None
+        return get_skin_cluster(geo)
 
     @staticmethod
-    def copy_to_sel_vertex(sourceObj, destVert):
+    def copy_to_sel_vertex(sourceObj, destVert, pruning=None):
         """
         Copy Skin Weights from object to list of vertex on over object
+        :param destVert: ComponentSet of the vertices or their names ('pCube1.vtx[0:10]')
+        :param pruning: (max influences, min weight) applied to the copied rows
         """
-        destObj = destVert[0].split('.')[0]
-        sourceSkin = cmds.ls(cmds.listHistory(sourceObj, pruneDagObjects=True), type='skinCluster')[0]
-        influences = cmds.skinCluster(sourceSkin, query=True, influence=True)
-        # find skinCluster on the destination object
-        destObjSkin = cmds.ls(cmds.listHistory(destObj, pruneDagObjects=True), type='skinCluster')[0]
-        destInfluences = cmds.skinCluster(destObjSkin, query=True, influence=True)
-        for inf in influences:
-            if cmds.nodeType(inf) == 'joint' and not inf in destInfluences:
-                cmds.skinCluster(destObjSkin, edit=True, lockWeights=False, weight=0, addInfluence=inf)
-        cmds.select(sourceObj, destVert)
-        cmds.copySkinWeights(noMirror=True, surfaceAssociation='closestPoint', influenceAssociation='oneToOne',
-                             normalize=True)
-        cmds.select(cl=True)
+        if not isinstance(destVert, ComponentSet):
+            destVert = ComponentSet.from_strings(destVert)[0]
+        destObj = destVert.node
+        vertices = destVert.indices()
+        transferred = transfer_weights([TransferSource(sourceObj)], destObj, vertices)
+        apply_weights(destObj, Skin.prune(destObj, transferred.take(vertices), pruning), vertices=vertices)
 
     @staticmethod
-    def copy(geo, dest_geo):
-        sourceSkin = cmds.ls(cmds.listHistory(geo, pruneDagObjects=True), type='skinCluster')[0]
-        influences = cmds.skinCluster(sourceSkin, query=True, influence=True)
-        joints = cmds.ls(influences, type='joint')  # getting joints list on source skinCluster
-        nurbs = list(set(influences) - set(joints))  # getting nurbs list on source skinCluster
-        # getting state   on source skinCluster
-        useComp = cmds.getAttr(sourceSkin + '.useComponents')
-        skin_method = cmds.getAttr(sourceSkin + '.skinningMethod')
-
-        # try to find history on the destination object
-        hist = cmds.listHistory(dest_geo, pruneDagObjects=True)
-        # try to find skinCluster on the destination object
-        dest_geoSkin = cmds.ls(hist, type='skinCluster')[0] if cmds.ls(hist, type='skinCluster') else None
-        if dest_geoSkin:
-            cmds.skinCluster(dest_geoSkin, e=True, unbind=True)  # unbind skinCluster with deleting history
-        tempJoint = None  # create new skinCluster on destination object with joints influences
-        if not joints:
-            cmds.select(clear=True)
-            tempJoint = cmds.joint()
-            joints = tempJoint
-        destSkin = cmds.skinCluster(dest_geo, joints, toSelectedBones=True, useGeometry=True, dropoffRate=4,
-                                    polySmoothness=False, nurbsSamples=25, rui=False, mi=5, omi=False,
-                                    normalizeWeights=True)[0]
-        if nurbs:  # add nurbs influences in new skinCluster
-            cmds.skinCluster(destSkin, edit=True, useGeometry=True, dropoffRate=4, polySmoothness=False,
-                             nurbsSamples=25,
-                             lockWeights=False, weight=0, addInfluence=nurbs)
-
-        # set state  attribute
-        cmds.setAttr((destSkin + '.useComponents'), useComp)
-        cmds.setAttr((destSkin + '.skinningMethod'), skin_method)
-
-        # copy skin weights from source object to destination
-        cmds.copySkinWeights(sourceSkin=sourceSkin, destinationSkin=destSkin, noMirror=True,
-                             surfaceAssociation='closestPoint', influenceAssociation='oneToOne', normalize=True)
-        if tempJoint:
-            cmds.delete(tempJoint)  # clear template joints
-
+    def copy(geo, dest_geo, source=None, uv_space=False, pruning=None):
+        """
+        Closest point copy of the weights of geo onto dest_geo
+        :param source: TransferSource (UVSource in uv space) of geo, when it is already built
+        :param uv_space: match the meshes by uvs instead of world positions
+        :param pruning: (max influences, min weight) applied to the copied weights
+        """
+        source = source or (UVSource(geo) if uv_space else TransferSource(geo))
+        if source.weights.topology and source.weights.topology == mesh_fingerprint(dest_geo):
+            # same topology: the rows are copied as they are, no spatial search (the source is shared by all targets)
+            skin_weights = source.weights.remap(source.weights.influences) if pruning else source.weights
+        else:
+            skin_weights = transfer_weights([source], dest_geo, uv_space=uv_space)
+        destSkin = apply_weights(dest_geo, Skin.prune(dest_geo, skin_weights, pruning))
         if cmds.getAttr('%s.deformUserNormals' % destSkin):  # setting up userNormals
             cmds.setAttr('%s.deformUserNormals' % destSkin, 0)
 
 
 class Utilities():
-    @staticmethod
-    def convert_slice_to_list(selection_list):
-        """
-        Converts a list of strings with index ranges into a list of individual elements.
-        """
-        pattern = r'(.+)\[(\d+):(\d+)\]|(.+)\[(\d+)\]'
-        output = list()
-        for selection in selection_list:
-            match = re.search(pattern, selection)
-            if match:
-                received_list = [x for x in match.groups() if x]
-                if len(received_list) == 2:
-                    output.append(received_list[0] + '[' + received_list[1] + ']')
-                else:
-                    elements_range = range(int(received_list[1]), int(received_list[2]) + 1)
-                    output += [received_list[0] + '[' + str(i) + ']' for i in elements_range]
-        return output
-
     @staticmethod
     def unique_names_generator(in_name, name_index_padding=3):
         """
@@ -762,46 +1046,73 @@ class Utilities():
 
 
 class Mirror:
+    _symmetry_cache = None
+
     def __init__(self, geo, pfx=['l_', 'r_'], namespace=str()):
         if namespace:
             namespace += ':' if not namespace[-1] == ':' else ''
         self.pfx = [namespace + x for x in pfx]
-        self.weight = Skin.get_weight(geo)
+        self.weights = Skin.read(geo)
+        self.points = None  # rest positions of the vertices, read when they are needed
         self.joints_in_same_position = list()
+        self.joint_clusters = list()
         self.geo = geo
 
-    def mirror(self):
-        # ________________________________ get a list of "problem" joints.
-        self.get_joints_in_same_position()
-        problem_joints_list = self.joints_in_same_position[:]
-
-        if not self.joints_in_same_position:
-            self.select_vertex_and_mirror()
-            return
+    def mirror(self, accuracy=0.01):
+        """
+        Mirrors the weights from +X to -X in memory and writes them into the existing skinCluster once.
+        Joints at the same position are paired by their side prefix (then by name similarity).
+        """
+        symmetry = self.symmetry(accuracy)
+        self.get_joints_in_same_position(accuracy)
+        pairs = pair_influences(self.weights.influences, self.weights.influence_positions, [self.pfx],
+                                tolerance=accuracy, joint_clusters=self.joint_clusters)
+        for joint in self.joints_in_same_position:
+            if pairs[joint] == joint and abs(self.weights.influence_positions[joint][0]) > accuracy:
+                om.MGlobal.displayWarning('No opposite joint found for "' + joint + '", its weights stay on it')
 
-        # ________________________________ create temporary joints and replace weight in the list
-        while problem_joints_list:
-            joint = problem_joints_list.pop()
-            offset = self.create_temp_joint(joint)
-            opposite_joint_name = self.get_opposite_joint_name(joint)
+        points = self.rest_points()
+        points = [tuple(points[i:i + 3]) for i in range(0, len(points), 3)]
+        mirrored = mirror_weights(self.weights, points, pairs, center_tolerance=accuracy, symmetry=symmetry)
+        write_weights(self.geo, mirrored, Skin.get_skin_claster(self.geo))
+        self.weights = mirrored
 
-            if opposite_joint_name in problem_joints_list:
-                problem_joints_list.remove(opposite_joint_name)
-                self.create_temp_joint(opposite_joint_name, offset=offset)
+    def rest_points(self):
+        if self.points is None:
+            self.points = get_rest_points(self.geo)
+        return self.points
 
-        # ________________________________ put weights with temporary joints, mirror and take the resulting weights
-        Skin.set_weight(geo=self.geo, weight=self.weight)
-        self.select_vertex_and_mirror()
-        self.weight = Skin.get_weight(self.geo)
+    def symmetry(self, accuracy=0.01):
+        """
+        Symmetry map of the mesh in its bind pose, from the cache
+        """
+        if not self.weights.topology:
+            raise RuntimeError('Weights can be mirrored on polygon meshes only')
+        return Mirror.symmetry_cache().get(self.weights.topology, self.rest_points(), tolerance=accuracy)
 
-        # ________________________________ change temporary joints to permanent ones in the dictionary with weights
-        for joint in self.joints_in_same_position:
-            self.weight[joint] = self.weight[joint + '_tmp_joint']
-            self.weight.pop(joint + '_tmp_joint')
+    @staticmethod
+    def select_off_center_vertices(geo, accuracy=0.01):
+        """
+        Selects the vertices that are not on the mirror plane (the center of the cached symmetry map)
+        as one component. Only the rest positions are read, the mesh does not need a skinCluster
+        """
+        points = get_rest_points(geo)
+        symmetry = Mirror.symmetry_cache().get(mesh_fingerprint(geo), points, tolerance=accuracy)
+        center = ComponentSet.from_indices(geo, symmetry.center)
+        off_center = ComponentSet(geo, 'vtx', [(0, len(points) // 3 - 1)]) - center
+        selection = om2.MSelectionList()
+        selection.add((get_shape_path(geo), off_center.component()))
+        om2.MGlobal.setActiveSelectionList(selection)
 
-        # ________________________________ put weights and remove temporary joints
-        Skin.set_weight(geo=self.geo, weight=self.weight)
-        cmds.delete([x + '_tmp_joint' for x in self.joints_in_same_position])
+    @staticmethod
+    def symmetry_cache():
+        """
+        Symmetry maps are stored in the current project, the cache is recreated when the project changes
+        """
+        directory = os.path.join(cmds.workspace(q=True, rd=True), SYMMETRY_DIR)
+        if Mirror._symmetry_cache is None or Mirror._symmetry_cache.directory != directory:
+            Mirror._symmetry_cache = SymmetryCache(directory)
+        return Mirror._symmetry_cache
 
     def get_opposite_joint_name(self, joint):
         pattern = r"^" + self.pfx[0]
@@ -811,34 +1122,16 @@ class Mirror:
         return right_joint
 
     def get_joints_in_same_position(self, accuracy=0.01):
-        joint_list = [x for x in self.weight.keys() if x not in AUXILIARY_ATTRIBUTES][:]
-        joint_list.sort()
-        while joint_list:
-            joint = joint_list.pop()
-            for i, over_jnt in enumerate(joint_list):
-                if Utilities.distance(over_jnt, joint) < accuracy:
-                    self.joints_in_same_position.append(joint_list.pop(i))
-
-    def create_temp_joint(self, target_joint, offset=0.0):
-        pos = cmds.xform(target_joint, q=True, t=True, ws=True)
-        if not offset:
-            offset = uniform(1, 5)
-        pos[1] += offset
-        cmds.select(cl=True)
-        cmds.joint(p=pos, n=target_joint + '_tmp_joint')
-
-        self.weight[target_joint + '_tmp_joint'] = self.weight[target_joint]
-        self.weight.pop(target_joint)
-        return offset
-
-    def select_vertex_and_mirror(self, accuracy=0.01):
-        vertices = cmds.ls(self.geo + '.vtx[*]', fl=True)  # all geo vertices
-        if accuracy:
-            vertices = [i for i in vertices if abs(cmds.pointPosition(i)[0]) > accuracy]  # remove the central row
-        cmds.select(vertices)
-
-        skin_cluster = cmds.ls(cmds.listHistory(self.geo, pdo=1), type='skinCluster')[0]
-        cmds.copySkinWeights(ss=skin_cluster, ds=skin_cluster, mirrorMode='YZ', mirrorInverse=False)
+        """
+        Groups the influences that share a position, from the positions read with the weights
+        :return: [[joint]] groups of coincident joints
+        """
+        positions = self.weights.influence_positions
+        joints = [x for x in self.weights.influences if x in positions]
+        self.joint_clusters = [[joints[i] for i in group]
+                               for group in clusters([positions[x] for x in joints], accuracy)]
+        self.joints_in_same_position = [x for group in self.joint_clusters for x in group]
+        return self.joint_clusters
 
     @staticmethod
     def skin_weight_manager():
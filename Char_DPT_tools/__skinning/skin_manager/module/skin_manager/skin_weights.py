@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse storage for the skin weights of one geometry.
+The module does not depend on Maya, so the same class is used by the scene engine and by the file readers.
+"""
+from array import array
+
+SKINNING_METHOD = "skinningMethod"
+PAINT_WEIGHTS = "paint_weights"
+
+OFFSET_TYPE = 'I'
+INDEX_TYPE = 'I'
+VALUE_TYPE = 'f'
+
+
+class SkinWeights(object):
+    """
+    Vertex x influence weight matrix in compressed sparse row form:
+    the non-zero weights of vertex v are values[offsets[v]:offsets[v + 1]],
+    their influence columns are indices[offsets[v]:offsets[v + 1]]
+    """
+
+    def __init__(self, influences, vertex_count, offsets=None, indices=None, values=None, skinning_method=0,
+                 blend_weights=None, influence_positions=None, topology=None, connectivity=None, points=None):
+        self.influences = list(influences)
+        self.vertex_count = vertex_count
+        self.offsets = offsets if offsets is not None else array(OFFSET_TYPE, [0]) * (vertex_count + 1)
+        self.indices = indices if indices is not None else array(INDEX_TYPE)
+        self.values = values if values is not None else array(VALUE_TYPE)
+        self.skinning_method = skinning_method
+        self.blend_weights = list(blend_weights) if blend_weights else list()
+        self.influence_positions = dict(influence_positions or dict())  # {influence: world position}
+        self.topology = topology  # fingerprint of the mesh the weights were read from (see topology.py)
+        self.connectivity = connectivity  # (polygon counts, polygon connects) of that mesh
+        self.points = points  # flat x, y, z world positions of its vertices, when they are saved
+
+    @property
+    def influence_count(self):
+        return len(self.influences)
+
+    @property
+    def nnz(self):
+        """
+        Number of stored (non-zero) weights
+        """
+        return len(self.values)
+
+    def index(self, influence):
+        return self.influences.index(influence)
+
+    def row(self, vertex):
+        """
+        :return: influence indices and weights of one vertex
+        """
+        start, end = self.offsets[vertex], self.offsets[vertex + 1]
+        return self.indices[start:end].tolist(), self.values[start:end].tolist()
+
+    def dense(self, start=0, end=None):
+        """
+        Rows [start:end] as one flat array (row per vertex), the form MFnSkinCluster.setWeights expects
+        """
+        end = self.vertex_count if end is None else end
+        count = self.influence_count
+        dense = array('d', [0.0]) * ((end - start) * count)
+        offsets, indices, values = self.offsets, self.indices, self.values
+        for vertex in range(start, end):
+            base = (vertex - start) * count
+            for k in range(offsets[vertex], offsets[vertex + 1]):
+                dense[base + indices[k]] = values[k]
+        return dense
+
+    def normalize(self, fallback_influence=0):
+        """
+        Scales every vertex row to a sum of 1.0, rows without weights go entirely to the fallback influence
+        """
+        offsets, values = self.offsets, self.values
+        empty_rows = list()
+        for vertex in range(self.vertex_count):
+            start, end = offsets[vertex], offsets[vertex + 1]
+            total = sum(values[start:end])
+            if total <= 0.0:
+                empty_rows.append(vertex)
+            elif abs(total - 1.0) > 1e-6:
+                for k in range(start, end):
+                    values[k] /= total
+        if empty_rows:
+            rows = [self.row(v) for v in range(self.vertex_count)]
+            for vertex in empty_rows:
+                rows[vertex] = [fallback_influence], [1.0]
+            self._set_rows(rows)
+
+    def prune(self, max_influences=0, threshold=0.0):
+        """
+        Keeps the max_influences largest weights of every vertex (0 for no limit) and drops weights below the
+        threshold, the largest weight of a vertex is always kept. Changed rows are renormalized.
+        :return: number of changed vertices
+        """
+        offsets, indices, values = self.offsets, self.indices, self.values
+        new_offsets, new_indices, new_values = array(OFFSET_TYPE, [0]), array(INDEX_TYPE), array(VALUE_TYPE)
+        changed = 0
+        for vertex in range(self.vertex_count):
+            start, end = offsets[vertex], offsets[vertex + 1]
+            if (max_influences and end - start > max_influences) or \
+                    (end > start and min(values[start:end]) < threshold):
+                ranked = sorted(range(start, end), key=values.__getitem__, reverse=True)
+                kept = [k for k in ranked[:max_influences or None] if values[k] >= threshold] or ranked[:1]
+                kept.sort()
+                total = sum(values[k] for k in kept)
+                new_indices.extend([indices[k] for k in kept])
+                new_values.extend([values[k] / total for k in kept])
+                changed += 1
+            else:
+                new_indices.extend(indices[start:end])
+                new_values.extend(values[start:end])
+            new_offsets.append(len(new_values))
+        if changed:
+            self.offsets, self.indices, self.values = new_offsets, new_indices, new_values
+        return changed
+
+    def remap(self, influences, mapping=None):
+        """
+        Expresses the weights in another influence list without touching the original.
+        :param influences: new influence list
+        :param mapping: {old name: new name}, names that are not mapped keep their name
+        Columns whose name is not in the new list are dropped, columns that end up on the same influence are summed.
+        """
+        mapping = mapping or dict()
+        positions = dict((mapping.get(name, name), pos) for name, pos in self.influence_positions.items()
+                         if mapping.get(name, name) in influences)
+        new_index = dict((name, i) for i, name in enumerate(influences))
+        column_map = [new_index.get(mapping.get(name, name), -1) for name in self.influences]
+        valid = [x for x in column_map if x >= 0]
+
+        if len(valid) == len(column_map) and len(set(valid)) == len(valid):
+            # a pure renaming / reordering: only the index array changes
+            indices = array(INDEX_TYPE, [column_map[i] for i in self.indices])
+            return SkinWeights(influences, self.vertex_count, offsets=array(OFFSET_TYPE, self.offsets),
+                               indices=indices, values=array(VALUE_TYPE, self.values),
+                               skinning_method=self.skinning_method, blend_weights=self.blend_weights,
+                               influence_positions=positions, topology=self.topology,
+                               connectivity=self.connectivity, points=self.points)
+
+        rows = list()
+        for vertex in range(self.vertex_count):
+            row = dict()
+            for i, value in zip(*self.row(vertex)):
+                target = column_map[i]
+                if target >= 0:
+                    row[target] = row.get(target, 0.0) + value
+            rows.append((list(row.keys()), list(row.values())))
+        skin_weights = SkinWeights(influences, self.vertex_count, skinning_method=self.skinning_method,
+                                   blend_weights=self.blend_weights, influence_positions=positions,
+                                   topology=self.topology, connectivity=self.connectivity, points=self.points)
+        skin_weights._set_rows(rows)
+        return skin_weights
+
+    def interpolate(self, barycentric, column_map=None):
+        """
+        Blends the rows of several vertices
+        :param barycentric: [(vertex, factor)]
+        :param column_map: target influence index for every influence, the same indices by default
+        :return: (influence indices, weights)
+        """
+        row = dict()
+        for vertex, factor in barycentric:
+            if factor <= 0.0:
+                continue
+            for i, value in zip(*self.row(vertex)):
+                target = column_map[i] if column_map else i
+                row[target] = row.get(target, 0.0) + value * factor
+        return list(row.keys()), list(row.values())
+
+    def reorder(self, order):
+        """
+        Moves every vertex row to a new vertex index
+        :param order: [new index for every vertex]
+        """
+        rows = [None] * self.vertex_count
+        for vertex, new_vertex in enumerate(order):
+            rows[new_vertex] = self.row(vertex)
+        blend_weights = list(self.blend_weights)
+        if len(blend_weights) == self.vertex_count:
+            for vertex, new_vertex in enumerate(order):
+                blend_weights[new_vertex] = self.blend_weights[vertex]
+        skin_weights = SkinWeights(self.influences, self.vertex_count, skinning_method=self.skinning_method,
+                                   blend_weights=blend_weights, influence_positions=self.influence_positions)
+        skin_weights._set_rows(rows)
+        return skin_weights
+
+    def take(self, vertices):
+        """
+        Rows of some vertices as a block for a partial write: row i of the block is the row of vertices[i]
+        """
+        blend_weights = None
+        if len(self.blend_weights) == self.vertex_count:
+            blend_weights = [self.blend_weights[v] for v in vertices]
+        block = SkinWeights(self.influences, len(vertices), skinning_method=self.skinning_method,
+                            blend_weights=blend_weights, influence_positions=self.influence_positions)
+        block._set_rows([self.row(v) for v in vertices])
+        return block
+
+    def _set_rows(self, rows):
+        """
+        Rebuilds the arrays from a list of (indices, values) rows
+        """
+        offsets, indices, values = array(OFFSET_TYPE, [0]), array(INDEX_TYPE), array(VALUE_TYPE)
+        for row_indices, row_values in rows:
+            non_zero = [k for k, value in enumerate(row_values) if value]
+            indices.extend([row_indices[k] for k in non_zero])
+            values.extend([row_values[k] for k in non_zero])
+            offsets.append(len(values))
+        self.offsets, self.indices, self.values = offsets, indices, values
+
+    def as_dict(self):
+        """
+        Legacy view: {influence: [weight per vertex], "skinningMethod": int, "paint_weights": [...]}
+        """
+        columns = [[0.0] * self.vertex_count for _ in self.influences]
+        offsets, indices, values = self.offsets, self.indices, self.values
+        for vertex in range(self.vertex_count):
+            for k in range(offsets[vertex], offsets[vertex + 1]):
+                columns[indices[k]][vertex] = values[k]
+        data = dict(zip(self.influences, columns))
+        data[SKINNING_METHOD] = self.skinning_method
+        data[PAINT_WEIGHTS] = list(self.blend_weights)
+        return data
+
+    @classmethod
+    def from_dense(cls, influences, vertex_count, dense, skinning_method=0, blend_weights=None,
+                   influence_positions=None, topology=None, connectivity=None, points=None):
+        """
+        Compresses a flat row-per-vertex weight array, zero weights are not stored
+        """
+        count = len(influences)
+        offsets, indices, values = array(OFFSET_TYPE, [0]), array(INDEX_TYPE), array(VALUE_TYPE)
+        for vertex in range(vertex_count):
+            row = dense[vertex * count:(vertex + 1) * count]
+            non_zero = [i for i, value in enumerate(row) if value]
+            indices.extend(non_zero)
+            values.extend([row[i] for i in non_zero])
+            offsets.append(len(values))
+        return cls(influences, vertex_count, offsets=offsets, indices=indices, values=values,
+                   skinning_method=skinning_method, blend_weights=blend_weights,
+                   influence_positions=influence_positions, topology=topology, connectivity=connectivity,
+                   points=points)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds the container from the legacy dictionary without modifying it
+        """
+        influences = [x for x in data if x not in (SKINNING_METHOD, PAINT_WEIGHTS)]
+        vertex_count = len(data[influences[0]]) if influences else 0
+        skin_weights = cls(influences, vertex_count, skinning_method=data.get(SKINNING_METHOD, 0),
+                           blend_weights=data.get(PAINT_WEIGHTS))
+        columns = [data[x] for x in influences]
+        rows = list()
+        for row in zip(*columns):
+            row_indices = [i for i, value in enumerate(row) if value]
+            rows.append((row_indices, [row[i] for i in row_indices]))
+        skin_weights._set_rows(rows)
+        return skin_weights
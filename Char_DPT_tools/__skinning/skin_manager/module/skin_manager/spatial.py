@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index helpers. Works without Maya.
+"""
+import math
+
+
+def squared_distance(a, b):
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+
+class PointGrid(object):
+    """
+    Uniform hash grid over 2D or 3D points for radius and nearest neighbour queries
+    """
+
+    def __init__(self, points, cell_size=None):
+        self.points = [tuple(x) for x in points]
+        self.dimension = len(self.points[0]) if self.points else 3
+        if not cell_size:
+            cell_size = self.auto_cell_size(self.points)
+        self.cell_size = cell_size
+        self._ring_offsets = dict()
+        self.cells = dict()
+        for i, point in enumerate(self.points):
+            self.cells.setdefault(self.cell(point), list()).append(i)
+        keys = list(self.cells)
+        self.bounds = [(min(x[d] for x in keys), max(x[d] for x in keys)) for d in range(self.dimension)] \
+            if keys else list()
+
+    @staticmethod
+    def auto_cell_size(points):
+        """
+        A cell size that puts about two points in a cell for evenly spread points
+        """
+        if len(points) < 2:
+            return 1.0
+        dimension = len(points[0])
+        extents = [max(x[d] for x in points) - min(x[d] for x in points) for d in range(dimension)]
+        extents = [x for x in extents if x > 0.0]
+        if not extents:
+            return 1.0
+        volume = 1.0
+        for extent in extents:
+            volume *= extent
+        return max((volume * 2.0 / len(points)) ** (1.0 / len(extents)), 1e-6)
+
+    def cell(self, point):
+        return tuple(int(math.floor(x / self.cell_size)) for x in point)
+
+    def _ring(self, center, ring):
+        """
+        Cell keys at Chebyshev distance 'ring' from the center cell
+        """
+        if ring not in self._ring_offsets:
+            offsets = [()]
+            for d in range(self.dimension):
+                offsets = [x + (offset,) for x in offsets for offset in range(-ring, ring + 1)]
+            self._ring_offsets[ring] = [x for x in offsets if max(abs(y) for y in x) == ring] if ring else offsets
+        return [tuple(c + o for c, o in zip(center, x)) for x in self._ring_offsets[ring]]
+
+    def _ring_size(self, ring):
+        return (2 * ring + 1) ** self.dimension - (2 * ring - 1) ** self.dimension if ring else 1
+
+    def _brute_force(self, point, count):
+        found = sorted((squared_distance(point, x), i) for i, x in enumerate(self.points))
+        return found[:count]
+
+    def _max_ring(self, center):
+        if not self.bounds:
+            return -1
+        return max(max(abs(center[d] - low), abs(high - center[d])) for d, (low, high) in enumerate(self.bounds))
+
+    def query_radius(self, point, radius):
+        """
+        :return: indices of the points closer than radius
+        """
+        reach = int(math.ceil(radius / self.cell_size))
+        center = self.cell(point)
+        radius_sq = radius * radius
+        if (2 * reach + 1) ** self.dimension > len(self.cells):
+            return [i for i, x in enumerate(self.points) if squared_distance(point, x) <= radius_sq]
+        result = list()
+        for ring in range(reach + 1):
+            for key in self._ring(center, ring):
+                for i in self.cells.get(key, ()):
+                    if squared_distance(point, self.points[i]) <= radius_sq:
+                        result.append(i)
+        return result
+
+    def nearest(self, point, count=1, max_distance=None):
+        """
+        :return: [(index, distance)] of the closest points, nearest first
+        """
+        center = self.cell(point)
+        max_ring = self._max_ring(center)
+        if max_distance is not None:
+            max_ring = min(max_ring, int(math.ceil(max_distance / self.cell_size)))
+        found = list()
+        ring = 0
+        while ring <= max_ring:
+            if self._ring_size(ring) > len(self.cells):
+                # far from the points: scanning the occupied cells is cheaper than walking empty rings
+                found = self._brute_force(point, count)
+                break
+            for key in self._ring(center, ring):
+                for i in self.cells.get(key, ()):
+                    found.append((squared_distance(point, self.points[i]), i))
+            # points beyond this ring are at least ring * cell_size away
+            if len(found) >= count:
+                found.sort()
+                if found[count - 1][0] <= (ring * self.cell_size) ** 2:
+                    break
+            ring += 1
+        found.sort()
+        result = [(i, math.sqrt(d)) for d, i in found[:count]]
+        if max_distance is not None:
+            result = [x for x in result if x[1] <= max_distance]
+        return result
+
+
+def clusters(points, tolerance):
+    """
+    Groups of points that lie within the tolerance of each other (directly or through a chain of neighbours)
+    :return: [[point index]] for the groups of two or more points
+    """
+    grid = PointGrid(points, cell_size=tolerance)
+    parent = list(range(len(points)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, point in enumerate(points):
+        for j in grid.query_radius(point, tolerance):
+            parent[root(j)] = root(i)
+    groups = dict()
+    for i in range(len(points)):
+        groups.setdefault(root(i), list()).append(i)
+    return [x for x in groups.values() if len(x) > 1]
+
+
+def _dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _sub(a, b):
+    return tuple(x - y for x, y in zip(a, b))
+
+
+def _triangle_weights(point, a, b, c):
+    """
+    Barycentric weights of the closest point of the triangle (region tests of Ericson's Real-Time Collision
+    Detection, any dimension)
+    """
+    ab, ac, ap = _sub(b, a), _sub(c, a), _sub(point, a)
+    d1, d2 = _dot(ab, ap), _dot(ac, ap)
+    if d1 <= 0.0 and d2 <= 0.0:
+        return 1.0, 0.0, 0.0
+    bp = _sub(point, b)
+    d3, d4 = _dot(ab, bp), _dot(ac, bp)
+    if d3 >= 0.0 and d4 <= d3:
+        return 0.0, 1.0, 0.0
+    vc = d1 * d4 - d3 * d2
+    if vc <= 0.0 and d1 >= 0.0 and d3 <= 0.0 and d1 != d3:
+        v = d1 / (d1 - d3)
+        return 1.0 - v, v, 0.0
+    cp = _sub(point, c)
+    d5, d6 = _dot(ab, cp), _dot(ac, cp)
+    if d6 >= 0.0 and d5 <= d6:
+        return 0.0, 0.0, 1.0
+    vb = d5 * d2 - d1 * d6
+    if vb <= 0.0 and d2 >= 0.0 and d6 <= 0.0 and d2 != d6:
+        w = d2 / (d2 - d6)
+        return 1.0 - w, 0.0, w
+    va = d3 * d6 - d5 * d4
+    if va <= 0.0 and d4 - d3 >= 0.0 and d5 - d6 >= 0.0 and (d4 - d3) + (d5 - d6):
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        return 0.0, 1.0 - w, w
+    if va + vb + vc <= 0.0:
+        # degenerate triangle: its closest corner
+        corners = sorted((squared_distance(point, x), i) for i, x in enumerate((a, b, c)))
+        return tuple(1.0 if i == corners[0][1] else 0.0 for i in range(3))
+    v, w = vb / (va + vb + vc), vc / (va + vb + vc)
+    return 1.0 - v - w, v, w
+
+
+def closest_on_triangle(point, a, b, c):
+    """
+    Closest point of a 2D or 3D triangle
+    :return: squared distance, barycentric weights of a, b and c
+    """
+    weights = _triangle_weights(point, a, b, c)
+    closest = [a[d] * weights[0] + b[d] * weights[1] + c[d] * weights[2] for d in range(len(point))]
+    return squared_distance(point, closest), weights
+
+
+class TriangleGrid(object):
+    """
+    Uniform grid over 2D triangles (UV space) for point location: every triangle is listed in the cells its
+    bounding box covers
+    """
+
+    def __init__(self, triangles, cell_size=None):
+        """
+        :param triangles: [(a, b, c)] with 2D corner points
+        """
+        self.triangles = [tuple(tuple(x) for x in triangle) for triangle in triangles]
+        if not cell_size:
+            sizes = [max(max(x[d] for x in triangle) - min(x[d] for x in triangle) for d in range(2))
+                     for triangle in self.triangles]
+            sizes = [x for x in sizes if x > 0.0]
+            cell_size = max(sum(sizes) / len(sizes), 1e-6) if sizes else 1.0
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.boxes = list()  # (min u, min v, max u, max v) of every triangle
+        for i, triangle in enumerate(self.triangles):
+            box = (min(x[0] for x in triangle), min(x[1] for x in triangle),
+                   max(x[0] for x in triangle), max(x[1] for x in triangle))
+            self.boxes.append(box)
+            low, high = self.cell(box[:2]), self.cell(box[2:])
+            for column in range(low[0], high[0] + 1):
+                for row in range(low[1], high[1] + 1):
+                    self.cells.setdefault((column, row), list()).append(i)
+        keys = list(self.cells)
+        self.bounds = [(min(x[d] for x in keys), max(x[d] for x in keys)) for d in range(2)] if keys else list()
+
+    def cell(self, point):
+        return int(math.floor(point[0] / self.cell_size)), int(math.floor(point[1] / self.cell_size))
+
+    def _ring(self, center, ring):
+        if not ring:
+            return [center]
+        keys = [(center[0] + x, center[1] + y) for x in range(-ring, ring + 1) for y in (-ring, ring)]
+        keys += [(center[0] + x, center[1] + y) for x in (-ring, ring) for y in range(-ring + 1, ring)]
+        return keys
+
+    def locate(self, point):
+        """
+        Triangle that contains the point, or the closest one
+        :return: (triangle index, barycentric weights, distance), None for an empty grid
+        """
+        if not self.triangles:
+            return None
+        center = self.cell(point)
+        max_ring = max(max(abs(center[d] - low), abs(high - center[d])) for d, (low, high) in enumerate(self.bounds))
+        # rings closer than the occupied cells are empty
+        min_ring = max(max(low - center[d], center[d] - high, 0) for d, (low, high) in enumerate(self.bounds))
+        best = None
+        checked = set()
+        for ring in range(min_ring, max_ring + 1):
+            if (2 * ring + 1) ** 2 - (2 * ring - 1) ** 2 > len(self.cells):
+                # far from the triangles: test all of them
+                candidates = range(len(self.triangles))
+            else:
+                candidates = [i for key in self._ring(center, ring) for i in self.cells.get(key, ())]
+            for i in candidates:
+                if i in checked:
+                    continue
+                checked.add(i)
+                box = self.boxes[i]
+                dx = max(box[0] - point[0], 0.0, point[0] - box[2])
+                dy = max(box[1] - point[1], 0.0, point[1] - box[3])
+                if best is not None and dx * dx + dy * dy >= best[0]:
+                    continue
+                distance_sq, weights = closest_on_triangle(point, *self.triangles[i])
+                if best is None or distance_sq < best[0]:
+                    best = distance_sq, i, weights
+            # triangles that were not seen yet are at least ring * cell_size away
+            if best is not None and (best[0] == 0.0 or best[0] <= (ring * self.cell_size) ** 2):
+                break
+            if len(checked) == len(self.triangles):
+                break
+        distance_sq, i, weights = best
+        return i, weights, math.sqrt(distance_sq)
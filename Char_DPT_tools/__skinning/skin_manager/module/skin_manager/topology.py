@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Mesh topology helpers. Works without Maya.
+A mesh is described by its vertex count and the face-vertex lists in the form MFnMesh.getVertices returns them:
+polygon_counts (number of vertices of every face) and polygon_connects (vertex indices of all faces in a row).
+"""
+import zlib
+from array import array
+
+
+class AmbiguousMatch(ValueError):
+    """
+    The topology matches in several ways (a symmetric mesh or identical pieces) and there are no positions
+    to tell them apart
+    """
+
+
+def _to_bytes(values):
+    data = array('i', values)
+    return data.tobytes() if hasattr(data, 'tobytes') else data.tostring()
+
+
+def fingerprint(vertex_count, polygon_counts, polygon_connects):
+    """
+    Short string that is equal for meshes with the same vertex count, face count and face-vertex connectivity
+    """
+    crc = zlib.crc32(_to_bytes(polygon_connects), zlib.crc32(_to_bytes(polygon_counts)))
+    return '%d:%d:%08x' % (vertex_count, len(polygon_counts), crc & 0xFFFFFFFF)
+
+
+class _Mesh(object):
+    """
+    Faces of a mesh with a directed edge lookup: the edge (a, b) is stored under a * vertex_count + b
+    as (face, corner of a)
+    """
+
+    def __init__(self, vertex_count, polygon_counts, polygon_connects):
+        self.vertex_count = vertex_count
+        self.faces = list()
+        self.edges = dict()
+        self.incidence = [0] * vertex_count  # number of faces around every vertex
+        position = 0
+        for face, count in enumerate(polygon_counts):
+            vertices = list(polygon_connects[position:position + count])
+            position += count
+            self.faces.append(vertices)
+            for corner, (vertex, next_vertex) in enumerate(zip(vertices, vertices[1:] + vertices[:1])):
+                self.edges[vertex * vertex_count + next_vertex] = (face, corner)
+                self.incidence[vertex] += 1
+        incidence = self.incidence
+        self.keys = [tuple(sorted([incidence[x] for x in vertices])) for vertices in self.faces]
+
+    def edge(self, vertex, next_vertex):
+        return self.edges.get(vertex * self.vertex_count + next_vertex)
+
+    def signature(self, face, shift=0):
+        """
+        Incidence of the face corners starting from the given corner
+        """
+        vertices = self.faces[face]
+        vertices = vertices[shift:] + vertices[:shift]
+        return tuple([self.incidence[x] for x in vertices])
+
+
+def _walk(saved, scene, seed, vertex_map, face_map, taken_vertices, taken_faces):
+    """
+    Grows a face correspondence from the seed over shared edges.
+    Every matched face pair (with the rotation between their corners) maps its neighbours across the same edges.
+    :param seed: (saved face, scene face, corner shift)
+    :param taken_vertices: scene vertices matched by earlier walks, taken_faces the same for faces
+    :return: new {saved vertex: scene vertex} and {saved face: scene face} entries, None on any contradiction
+    """
+    new_vertices = dict()
+    new_faces = {seed[0]: seed[1]}
+    used_vertices = set()
+    used_faces = {seed[1]}
+    stack = [seed]
+    while stack:
+        face, other, shift = stack.pop()
+        vertices, other_vertices = saved.faces[face], scene.faces[other]
+        count = len(vertices)
+        for corner in range(count):
+            vertex, target = vertices[corner], other_vertices[(corner + shift) % count]
+            known = new_vertices.get(vertex, vertex_map.get(vertex))
+            if known is None:
+                if target in used_vertices or target in taken_vertices or \
+                        saved.incidence[vertex] != scene.incidence[target]:
+                    return None
+                new_vertices[vertex] = target
+                used_vertices.add(target)
+            elif known != target:
+                return None
+
+            # neighbour across the edge (vertex, next) is found on the twin edge (next, vertex)
+            next_vertex = vertices[(corner + 1) % count]
+            next_target = other_vertices[(corner + shift + 1) % count]
+            twin = saved.edge(next_vertex, vertex)
+            other_twin = scene.edge(next_target, target)
+            if (twin is None) != (other_twin is None):
+                return None
+            if twin is None:
+                continue
+            neighbour, neighbour_corner = twin
+            other_neighbour, other_corner = other_twin
+            known_face = new_faces.get(neighbour, face_map.get(neighbour))
+            if known_face is not None:
+                if known_face != other_neighbour:
+                    return None
+                continue
+            if other_neighbour in used_faces or other_neighbour in taken_faces or \
+                    len(saved.faces[neighbour]) != len(scene.faces[other_neighbour]):
+                return None
+            new_faces[neighbour] = other_neighbour
+            used_faces.add(other_neighbour)
+            stack.append((neighbour, other_neighbour,
+                          (other_corner - neighbour_corner) % len(saved.faces[neighbour])))
+    return new_vertices, new_faces
+
+
+def _position_error(vertex_map, saved_points, scene_points):
+    """
+    Mean squared distance between the saved and the scene positions of the matched vertices
+    """
+    total = 0.0
+    for vertex, target in vertex_map.items():
+        a, b = vertex * 3, target * 3
+        total += (saved_points[a] - scene_points[b]) ** 2 + (saved_points[a + 1] - scene_points[b + 1]) ** 2 + \
+            (saved_points[a + 2] - scene_points[b + 2]) ** 2
+    return total / max(len(vertex_map), 1)
+
+
+def match_vertices(saved, scene, max_attempts=64, points=None, tolerance=1e-6):
+    """
+    Finds the vertex order of the scene mesh when it has the same topology as the saved one but shuffled indices.
+    Every connected piece is matched by walking the faces from an anchor: a saved face with the rarest
+    corner incidence pattern, tried against the scene faces with the same pattern.
+    Topologically symmetric pieces (and identical pieces) walk from several anchors: with positions the anchor
+    whose matched vertices lie closest to their saved positions wins, without them the match is ambiguous.
+    :param saved: (vertex count, polygon counts, polygon connects) stored in the weight file
+    :param scene: the same for the scene mesh
+    :param points: (saved flat x, y, z positions, scene flat x, y, z positions)
+    :param tolerance: mean squared distance that accepts an anchor without trying the others
+    :return: [scene vertex for every saved vertex], None when the meshes do not match
+    :raise AmbiguousMatch: several anchors fit and no positions are given
+    """
+    if saved[0] != scene[0] or len(saved[1]) != len(scene[1]) or len(saved[2]) != len(scene[2]):
+        return None
+    saved, scene = _Mesh(*saved), _Mesh(*scene)
+
+    scene_faces = dict()  # {sorted incidence signature: [scene face]}
+    for face, key in enumerate(scene.keys):
+        scene_faces.setdefault(key, list()).append(face)
+    rarity = dict((key, len(value)) for key, value in scene_faces.items())
+
+    vertex_map = dict()
+    face_map = dict()
+    matched_scene_faces = set()
+    matched_scene_vertices = set()
+    pending = sorted(range(len(saved.faces)), key=lambda x: rarity.get(saved.keys[x], 0))
+    for face in pending:
+        if face in face_map:
+            continue
+        signature = saved.signature(face)
+        candidates = [x for x in scene_faces.get(saved.keys[face], list()) if x not in matched_scene_faces]
+        result = None
+        best_error = None
+        found = 0
+        attempts = 0
+        for other in candidates:
+            for shift in range(len(signature)):
+                if scene.signature(other, shift) != signature:
+                    continue
+                attempts += 1
+                walked = _walk(saved, scene, (face, other, shift), vertex_map, face_map,
+                               matched_scene_vertices, matched_scene_faces)
+                if walked:
+                    found += 1
+                    if points is None:
+                        if found > 1:
+                            raise AmbiguousMatch('The topology matches in several ways')
+                        result = walked
+                    else:
+                        error = _position_error(walked[0], *points)
+                        if best_error is None or error < best_error:
+                            result, best_error = walked, error
+                if attempts >= max_attempts or (best_error is not None and best_error <= tolerance):
+                    break
+            if attempts >= max_attempts or (best_error is not None and best_error <= tolerance):
+                break
+        if not result:
+            return None
+        vertex_map.update(result[0])
+        face_map.update(result[1])
+        matched_scene_faces.update(result[1].values())
+        matched_scene_vertices.update(result[0].values())
+
+    if len(vertex_map) != saved.vertex_count:
+        return None  # vertices without faces can not be matched
+    return [vertex_map[x] for x in range(saved.vertex_count)]
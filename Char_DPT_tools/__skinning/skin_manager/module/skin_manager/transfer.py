@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Closest point skin weight transfer.
+A source keeps the sparse weights of a skinned mesh and an MMeshIntersector (a BVH over its triangles).
+Intersectors are kept in a session cache until their mesh changes, so repeated copies from the same source skip
+the rebuild. Weights are interpolated with the barycentric coordinates of the closest point on the closest
+triangle, the result goes straight into the bulk weight writer.
+In uv space the same interpolation is done on the closest uv triangle, found through a 2D grid.
+"""
+import zlib
+from array import array
+from collections import OrderedDict
+
+import maya.api.OpenMaya as om2
+
+from skin_engine import read_weights, get_shape_path
+from skin_weights import SkinWeights
+from spatial import TriangleGrid
+
+CACHE_BUDGET = 512 * 1024 * 1024  # bytes
+BYTES_PER_FACE_VERTEX = 64  # rough size of the intersector and the mesh copy per polygon corner
+
+
+def mesh_state(shape_path):
+    """
+    Key of the current topology and point positions of a mesh: any edit, deformation or move changes it
+    :return: (vertex count, polygon count, face vertex count, crc of the points, world matrix)
+    """
+    mesh = om2.MFnMesh(shape_path)
+    coordinates = array('d')
+    for point in mesh.getPoints(om2.MSpace.kObject):
+        coordinates.extend((point.x, point.y, point.z))
+    data = coordinates.tobytes() if hasattr(coordinates, 'tobytes') else coordinates.tostring()
+    return (mesh.numVertices, mesh.numPolygons, mesh.numFaceVertices, zlib.crc32(data),
+            tuple(shape_path.inclusiveMatrix()))
+
+
+class SourceIndex(object):
+    """
+    Closest point structure of one mesh in one deformation state
+    """
+
+    def __init__(self, shape_path, state):
+        self.state = state
+        self.handle = om2.MObjectHandle(shape_path.node())
+        self.mesh = om2.MFnMesh(shape_path)
+        self.matrix = shape_path.inclusiveMatrix()
+        self.intersector = om2.MMeshIntersector()
+        self.intersector.create(shape_path.node(), self.matrix)
+        self.size = self.mesh.numFaceVertices * BYTES_PER_FACE_VERTEX
+
+    def closest(self, point):
+        """
+        :param point: world space MPoint
+        :return: distance, [(source vertex, barycentric factor)]
+        """
+        point_on_mesh = self.intersector.getClosestPoint(point)
+        u, v = point_on_mesh.barycentricCoords
+        a, b, c = self.mesh.getPolygonTriangleVertices(point_on_mesh.face, point_on_mesh.triangle)
+        closest = om2.MPoint(point_on_mesh.point) * self.matrix  # the intersector answers in object space
+        return point.distanceTo(closest), [(a, u), (b, v), (c, 1.0 - u - v)]
+
+    def is_node(self, node):
+        """
+        False once the mesh was deleted or the scene was reopened, even if a new node has the same path and points
+        """
+        return self.handle.isValid() and self.handle.isAlive() and \
+            self.handle.hashCode() == om2.MObjectHandle(node).hashCode()
+
+
+class IndexCache(object):
+    """
+    Source indices of the session, least recently used ones are dropped when the budget is exceeded.
+    An entry is rebuilt as soon as the topology or the points of its mesh change, or its node is replaced.
+    """
+
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self._entries = OrderedDict()  # {shape full path: SourceIndex}, oldest first
+
+    def get(self, geo):
+        shape_path = get_shape_path(geo)
+        key = shape_path.fullPathName()
+        state = mesh_state(shape_path)
+        index = self._entries.pop(key, None)
+        if index is None or index.state != state or not index.is_node(shape_path.node()):
+            index = SourceIndex(shape_path, state)
+        self._entries[key] = index
+        self._evict()
+        return index
+
+    def size(self):
+        return sum(x.size for x in self._entries.values())
+
+    def clear(self):
+        self._entries.clear()
+
+    def _evict(self):
+        total = self.size()
+        while len(self._entries) > 1 and total > self.budget:
+            key, index = self._entries.popitem(last=False)
+            total -= index.size
+
+
+INDEX_CACHE = IndexCache()
+
+
+class TransferSource(object):
+    """
+    Current weights of a source mesh with its (cached) closest point index.
+    The index is looked up on the first query, a copy onto the same topology never needs it.
+    """
+
+    def __init__(self, geo, cache=INDEX_CACHE):
+        self.geo = geo
+        self.weights = read_weights(geo)
+        self._cache = cache
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self._cache.get(self.geo)
+        return self._index
+
+    def closest(self, point):
+        return self.index.closest(point)
+
+
+class UVSource(TransferSource):
+    """
+    Source that is queried in uv space (current uv set) through a grid over its uv triangles.
+    The world space index is still used for target vertices without uvs.
+    """
+
+    def __init__(self, geo, cache=INDEX_CACHE):
+        super(UVSource, self).__init__(geo, cache)
+        triangles, self.triangle_vertices = get_uv_triangles(get_shape_path(geo))
+        if not triangles:
+            raise RuntimeError('"' + geo + '" has no uvs')
+        self.grid = TriangleGrid(triangles)
+
+    def closest_uv(self, uv):
+        """
+        :return: uv distance, [(source vertex, barycentric factor)]
+        """
+        triangle, weights, distance = self.grid.locate(uv)
+        return distance, list(zip(self.triangle_vertices[triangle], weights))
+
+
+def _face_uvs(mesh):
+    """
+    :return: [(face vertices, uv ids of the same corners or None)] in the current uv set
+    """
+    uv_counts, uv_ids = mesh.getAssignedUVs(mesh.currentUVSetName())
+    polygon_counts, polygon_connects = mesh.getVertices()
+    polygon_connects, uv_ids = list(polygon_connects), list(uv_ids)
+    faces = list()
+    position = uv_position = 0
+    for count, uv_count in zip(polygon_counts, uv_counts):
+        face_uvs = uv_ids[uv_position:uv_position + uv_count] if uv_count == count else None
+        faces.append((polygon_connects[position:position + count], face_uvs))
+        position += count
+        uv_position += uv_count
+    return faces
+
+
+def get_uv_triangles(shape_path):
+    """
+    Triangles of the mesh in uv space, faces without uvs are left out
+    :return: [((u, v), (u, v), (u, v))], [(vertex, vertex, vertex)]
+    """
+    mesh = om2.MFnMesh(shape_path)
+    us, vs = mesh.getUVs(mesh.currentUVSetName())
+    triangle_counts, triangle_vertices = mesh.getTriangles()
+    triangle_vertices = list(triangle_vertices)
+    triangles = list()
+    corners = list()
+    position = 0
+    for (face_vertices, face_uvs), count in zip(_face_uvs(mesh), triangle_counts):
+        if face_uvs:
+            uv_of = dict(zip(face_vertices, face_uvs))
+            for i in range(position, position + count * 3, 3):
+                vertices = tuple(triangle_vertices[i:i + 3])
+                triangles.append(tuple((us[uv_of[x]], vs[uv_of[x]]) for x in vertices))
+                corners.append(vertices)
+        position += count * 3
+    return triangles, corners
+
+
+def get_target_uvs(geo):
+    """
+    First uv of every vertex in the current uv set, None for vertices without uvs
+    """
+    mesh = om2.MFnMesh(get_shape_path(geo))
+    us, vs = mesh.getUVs(mesh.currentUVSetName())
+    uvs = [None] * mesh.numVertices
+    for face_vertices, face_uvs in _face_uvs(mesh):
+        for vertex, uv in zip(face_vertices, face_uvs or ()):
+            if uvs[vertex] is None:
+                uvs[vertex] = (us[uv], vs[uv])
+    return uvs
+
+
+def get_target_points(geo):
+    """
+    World space positions of all vertices of the mesh
+    """
+    return om2.MFnMesh(get_shape_path(geo)).getPoints(om2.MSpace.kWorld)
+
+
+def transfer_weights(sources, target, vertices=None, uv_space=False):
+    """
+    Projects the weights of one or several sources onto the target mesh, each vertex takes the closest source
+    :param sources: [TransferSource], [UVSource] in uv space
+    :param vertices: target vertex indices to compute, all vertices by default (the other rows stay empty)
+    :param uv_space: match target and source vertices by their uvs instead of world positions
+    :return: SkinWeights with the union of the source influences
+    """
+    influences = list()
+    column_maps = list()
+    for source in sources:
+        column_map = list()
+        for name in source.weights.influences:
+            if name not in influences:
+                influences.append(name)
+            column_map.append(influences.index(name))
+        column_maps.append(column_map)
+
+    points = get_target_points(target)
+    uvs = get_target_uvs(target) if uv_space else [None] * len(points)
+    if vertices is None:
+        vertices = range(len(points))
+    rows = [([], [])] * len(points)
+
+    for vertex in vertices:
+        best = None
+        for s, source in enumerate(sources):
+            if uvs[vertex] is None:
+                distance, barycentric = source.closest(points[vertex])
+            else:
+                distance, barycentric = source.closest_uv(uvs[vertex])
+            if best is None or distance < best[0]:
+                best = distance, s, barycentric
+        distance, s, barycentric = best
+        rows[vertex] = sources[s].weights.interpolate(barycentric, column_maps[s])
+
+    first = sources[0].weights
+    skin_weights = SkinWeights(influences, len(points), skinning_method=first.skinning_method,
+                               influence_positions=dict((k, v) for source in sources
+                                                        for k, v in source.weights.influence_positions.items()))
+    skin_weights._set_rows(rows)
+    return skin_weights
+
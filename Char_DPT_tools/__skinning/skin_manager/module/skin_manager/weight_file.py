@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Reading and writing of skin weight files. Works without Maya.
+
+Binary layout (little-endian):
+    magic 'SKWF' | uint16 version | uint32 header size | utf-8 json header | weight blocks
+The header holds the geometry table (name, vertex count, influences and their world positions,
+skinning method, blend weights count, number of stored weights, topology fingerprint, polygon,
+face vertex and saved point counts) and the index of every geometry block: its offset from the end
+of the header and its length in bytes. A block holds the sparse weight rows (uint32 row offsets,
+uint16/uint32 influence indices, float32 weights) followed by float32 blend weights and, for meshes,
+int32 polygon counts, int32 polygon connects and optional float32 x, y, z vertex positions, so one
+geometry can be read from a memory map without touching the others.
+
+Old json '.dat' files are still read (and can be written) as a legacy format.
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+
+from skin_weights import SkinWeights, INDEX_TYPE
+
+MAGIC = b'SKWF'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+BINARY_EXTENSION = '.skw'
+LEGACY_EXTENSION = '.dat'
+FILE_FILTER = 'Skin weights (*' + BINARY_EXTENSION + ' *' + LEGACY_EXTENSION + ')'
+
+
+def _to_bytes(values, typecode):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes() if hasattr(data, 'tobytes') else data.tostring()
+
+
+def _from_bytes(buffer, typecode):
+    data = array(typecode)
+    if hasattr(data, 'frombytes'):
+        data.frombytes(buffer)
+    else:
+        data.fromstring(buffer)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def is_binary(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write(path, data):
+    """
+    Saves weights in the binary format
+    :param data: {geometry name: SkinWeights}
+    """
+    table = list()
+    position = 0
+    for name, skin_weights in data.items():
+        entry = {'name': name,
+                 'vertex_count': skin_weights.vertex_count,
+                 'influences': skin_weights.influences,
+                 'skinning_method': skin_weights.skinning_method,
+                 'blend_count': len(skin_weights.blend_weights),
+                 'nnz': skin_weights.nnz,
+                 'index_type': _index_type(skin_weights.influence_count),
+                 'influence_positions': skin_weights.influence_positions,
+                 'topology': skin_weights.topology,
+                 'face_count': len(skin_weights.connectivity[0]) if skin_weights.connectivity else 0,
+                 'connect_count': len(skin_weights.connectivity[1]) if skin_weights.connectivity else 0,
+                 'point_count': len(skin_weights.points) // 3 if skin_weights.points else 0,
+                 'offset': position}
+        entry['length'] = _block_length(entry)
+        position += entry['length']
+        table.append(entry)
+    header = json.dumps({'geometries': table}).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for skin_weights, geo in zip(data.values(), table):
+            f.write(_to_bytes(skin_weights.offsets, 'I'))
+            f.write(_to_bytes(skin_weights.indices, geo['index_type']))
+            f.write(_to_bytes(skin_weights.values, 'f'))
+            f.write(_to_bytes(skin_weights.blend_weights, 'f'))
+            if skin_weights.connectivity:
+                f.write(_to_bytes(skin_weights.connectivity[0], 'i'))
+                f.write(_to_bytes(skin_weights.connectivity[1], 'i'))
+            if skin_weights.points:
+                f.write(_to_bytes(skin_weights.points, 'f'))
+
+
+def read(path, names=None):
+    """
+    Loads a weight file of any supported format
+    :param names: geometries to load, all of them by default
+    :return: OrderedDict {geometry name: SkinWeights}
+    """
+    with WeightArchive(path) as archive:
+        return archive.read_all(names)
+
+
+class WeightArchive(object):
+    """
+    Random access to the geometries of a weight file.
+    Only the header is parsed on opening, weight blocks are decoded from a memory map when requested.
+    Legacy json files are parsed completely.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.geometries = OrderedDict()
+        self._file = None
+        self._map = None
+        self._legacy = None
+
+        if not is_binary(path):
+            self._legacy = read_legacy(path)
+            for name, skin_weights in self._legacy.items():
+                self.geometries[name] = {'name': name,
+                                         'vertex_count': skin_weights.vertex_count,
+                                         'influences': skin_weights.influences,
+                                         'skinning_method': skin_weights.skinning_method}
+            return
+
+        self._file = open(path, 'rb')
+        magic, self.version, header_size = PREAMBLE.unpack(self._file.read(PREAMBLE.size))
+        if self.version != VERSION:
+            self.close()
+            raise IOError('Unsupported weight file version: ' + str(self.version))
+        header = json.loads(self._file.read(header_size).decode('utf-8'))
+        data_start = PREAMBLE.size + header_size
+
+        for geo in header['geometries']:
+            geo['offset'] += data_start
+            self.geometries[geo['name']] = geo
+        if any(geo['length'] for geo in self.geometries.values()):
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.geometries
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def names(self):
+        return list(self.geometries.keys())
+
+    def read(self, name):
+        """
+        Decodes the weights of one geometry
+        :return: SkinWeights
+        """
+        if self._legacy is not None:
+            return self._legacy[name]
+        geo = self.geometries[name]
+        return _decode_block(self._map[geo['offset']:geo['offset'] + geo['length']], geo)
+
+    def read_all(self, names=None):
+        """
+        :return: OrderedDict {geometry name: SkinWeights} for the given (or all) geometries
+        """
+        names = self.names() if names is None else [x for x in self.names() if x in names]
+        return OrderedDict((name, self.read(name)) for name in names)
+
+
+def _index_type(influence_count):
+    return 'H' if influence_count <= 0xFFFF else 'I'
+
+
+def _block_length(geo):
+    """
+    Size in bytes of the weight block of one geometry
+    """
+    index_size = array(geo['index_type']).itemsize
+    return (geo['vertex_count'] + 1) * 4 + geo['nnz'] * (index_size + 4) + geo['blend_count'] * 4 + \
+        (geo['face_count'] + geo['connect_count'] + geo['point_count'] * 3) * 4
+
+
+def _decode_block(buffer, geo):
+    """
+    Decodes the weight block of one geometry
+    """
+    vertex_count = geo['vertex_count']
+    position = [0]
+
+    def take(typecode, count):
+        size = count * array(typecode).itemsize
+        chunk = buffer[position[0]:position[0] + size]
+        position[0] += size
+        return _from_bytes(chunk, typecode)
+
+    offsets = take('I', vertex_count + 1)
+    indices = take(geo['index_type'], geo['nnz'])
+    values = take('f', geo['nnz'])
+    blend_weights = take('f', geo['blend_count']).tolist()
+    connectivity = None
+    if geo['face_count']:
+        connectivity = take('i', geo['face_count']), take('i', geo['connect_count'])
+    points = take('f', geo['point_count'] * 3) if geo['point_count'] else None
+    if indices.typecode != INDEX_TYPE:
+        indices = array(INDEX_TYPE, indices)
+    return SkinWeights(geo['influences'], vertex_count, offsets=offsets, indices=indices, values=values,
+                       skinning_method=geo['skinning_method'], blend_weights=blend_weights,
+                       influence_positions=geo['influence_positions'], topology=geo['topology'],
+                       connectivity=connectivity, points=points)
+
+
+def read_legacy(path):
+    """
+    Loads an old json file: [{geometry: {influence: [weights], "skinningMethod": int, "paint_weights": [...]}}]
+    """
+    with open(path, 'r') as f:
+        raw = json.load(f, object_pairs_hook=OrderedDict)[0]
+    return OrderedDict((name, SkinWeights.from_dict(raw[name])) for name in raw)
+
+
+def write_legacy(path, data):
+    with open(path, 'w') as f:
+        json.dump([dict((name, data[name].as_dict()) for name in data), ], f, indent=4)
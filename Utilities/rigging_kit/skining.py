@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import math
 import re
-from random import uniform
 import maya.cmds as cmds
 import maya.mel as mm
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
 
 from .utilities import distance
 
@@ -71,29 +73,63 @@ def setSkin(geo, weight):
     useGeoFlag = True if [x for x in jnt if not cmds.objectType(x) == 'joint'] else False  # influense geo test
     if useGeoFlag:  cmds.setAttr(skCluster + ".useComponents", 1)
     cmds.skinCluster(skCluster, e=True, useGeometry=useGeoFlag, addInfluence=jnt[1:], wt=0.0)  # add influenses
-    pointsList = range(len(weight[jnt[0]]))  # point number list
-    jntAndPos = []  # joint and pos in claster list
-    for jn in jnt[1:]:
-        jntAndPos.append([jn,
-                          [x for x in cmds.connectionInfo(jn + '.worldMatrix[0]', dfs=True) if skCluster in x][0].split(
-                              ']')[0].split('[')[1]])  # get position in clasters jnt list
-    for jn, pos in jntAndPos:  # go through all the joints except the first one and it positions in skin claster
-        for i in pointsList:  # go through all points for carrent joint
-            if weight[jn][i] > 0:  # if point weight larger than 0
-                oldWeight = cmds.getAttr(
-                    skCluster + ".weightList[" + str(i) + "].w[0]")  # get point weight for first joint
-                cmds.setAttr(skCluster + ".weightList[" + str(i) + "].w[0]",
-                             oldWeight - weight[jn][i])  # correct and set point weight for first joint
-                cmds.setAttr(skCluster + ".weightList[" + str(i) + "].w[" + pos + "]",
-                             weight[jn][i])  # set point weight for carrent joint
+    set_weights_bulk(skCluster, geo, jnt, weight)
 
     # rebuilds dq weights
     cmds.setAttr(skCluster + ".skinningMethod", skinning_method)
-    for i, each in enumerate(bland_attr):
-        mm.eval('setAttr ' + skCluster + '.bw[%d] %s' % (i, each))
+    if bland_attr:
+        cmds.setAttr(skCluster + '.bw[0:%d]' % (len(bland_attr) - 1), *bland_attr)
     return skCluster
 
 
+def get_complete_component(shape_path):
+    """
+    Component object that covers all control points of a mesh, nurbs curve or nurbs surface
+    """
+    if shape_path.hasFn(om2.MFn.kMesh):
+        component = om2.MFnSingleIndexedComponent()
+        component_obj = component.create(om2.MFn.kMeshVertComponent)
+        component.setCompleteData(om2.MFnMesh(shape_path).numVertices)
+    elif shape_path.hasFn(om2.MFn.kNurbsCurve):
+        component = om2.MFnSingleIndexedComponent()
+        component_obj = component.create(om2.MFn.kCurveCVComponent)
+        component.setCompleteData(om2.MFnNurbsCurve(shape_path).numCVs)
+    elif shape_path.hasFn(om2.MFn.kNurbsSurface):
+        surface = om2.MFnNurbsSurface(shape_path)
+        component = om2.MFnDoubleIndexedComponent()
+        component_obj = component.create(om2.MFn.kSurfaceCVComponent)
+        component.setCompleteData(surface.numCVsInU, surface.numCVsInV)
+    else:
+        raise RuntimeError('Unsupported geometry type: ' + shape_path.partialPathName())
+    return component_obj
+
+
+def set_weights_bulk(skCluster, geo, jnts, weight):
+    """
+    Writes weights of all joints and points with one MFnSkinCluster.setWeights call, rows are normalized beforehand.
+    Influences of the cluster that are not in jnts get zero weights, so every row sums to 1.0
+    """
+    sel = om2.MSelectionList()
+    sel.add(skCluster)
+    skin_fn = oma2.MFnSkinCluster(sel.getDependNode(0))
+    cluster_jnts = [x.partialPathName() for x in skin_fn.influenceObjects()]
+    others = [x for x in cluster_jnts if x not in jnts]
+    indices = om2.MIntArray([cluster_jnts.index(jn) for jn in list(jnts) + others])
+
+    # row per point, converted to an MDoubleArray once
+    values = []
+    zeros = [0.0] * len(others)
+    empty_row = [1.0] + [0.0] * (len(jnts) - 1) + zeros
+    for row in zip(*[weight[jn] for jn in jnts]):
+        total = sum(row)
+        values.extend([x / total for x in row] + zeros if total > 0.0 else empty_row)
+
+    shape = cmds.listRelatives(geo, s=True, ni=True, f=True)[0] if cmds.objectType(geo, isAType='transform') else geo
+    sel.add(shape)
+    shape_path = sel.getDagPath(1)
+    skin_fn.setWeights(shape_path, get_complete_component(shape_path), indices, om2.MDoubleArray(values), False)
+
+
 def copySkin(geo, dest_geo):
     sourceSkin = cmds.ls(cmds.listHistory(geo, pruneDagObjects=True), type='skinCluster')[0]
     influences = cmds.skinCluster(sourceSkin, query=True, influence=True)
@@ -236,45 +272,134 @@ def copyAndMirrowWeights(s_geo='', t_geo=''):
     mm.eval('MirrorSkinWeights')
 
 
-def get_jnt_in_same_pos(geometry, accuracy=0.01):
+class PointHash(object):
     """
-    Returns a list of joints from a skin cluster located at the same point.
-    Used for correct copying of scales
+    Hash grid over 3D points for radius and nearest point queries.
+    Cells hold about two points of an evenly spread cloud, the nearest point is searched ring by ring
+    around the cell of the query (the rigging kit can not import the spatial module of the skin manager).
     """
 
-    skin_cluster = cmds.ls(cmds.listHistory(geometry, pdo=1), type='skinCluster')[0]
-    joints_list = cmds.ls(cmds.listHistory(skin_cluster, levels=1), type='joint')
+    def __init__(self, points, cell_size=None):
+        self.points = [tuple(p) for p in points]
+        if not cell_size:
+            extents = [max(p[d] for p in self.points) - min(p[d] for p in self.points) for d in xrange(3)] \
+                if len(self.points) > 1 else []
+            extents = [x for x in extents if x > 0.0]
+            volume = reduce(lambda a, b: a * b, extents, 1.0)
+            cell_size = max((volume * 2.0 / len(self.points)) ** (1.0 / len(extents)), 1e-6) if extents else 1.0
+        self.cell_size = cell_size
+        self.cells = {}
+        for i, p in enumerate(self.points):
+            self.cells.setdefault(self.cell(p), []).append(i)
+        keys = list(self.cells)
+        self.bounds = [(min(k[d] for k in keys), max(k[d] for k in keys)) for d in xrange(3)] if keys else []
+
+    def cell(self, point):
+        return tuple(int(math.floor(x / self.cell_size)) for x in point)
+
+    @staticmethod
+    def ring(center, ring):
+        """
+        Cell keys at Chebyshev distance 'ring' from the center cell
+        """
+        steps = xrange(-ring, ring + 1)
+        return [(center[0] + x, center[1] + y, center[2] + z) for x in steps for y in steps for z in steps
+                if max(abs(x), abs(y), abs(z)) == ring]
+
+    def query_radius(self, point, radius):
+        """
+        Indices of the points closer than radius
+        """
+        center = self.cell(point)
+        return [i for ring in xrange(int(math.ceil(radius / self.cell_size)) + 1)
+                for key in self.ring(center, ring) for i in self.cells.get(key, [])
+                if distance(self.points[i], point) <= radius]
+
+    def nearest(self, point):
+        """
+        Index of the closest point
+        """
+        if not self.points:
+            return None
+        center = self.cell(point)
+        max_ring = max(max(abs(center[d] - low), abs(high - center[d])) for d, (low, high) in enumerate(self.bounds))
+        # rings closer than the bounding box of the occupied cells are empty
+        min_ring = max(max(low - center[d], center[d] - high, 0) for d, (low, high) in enumerate(self.bounds))
+        x, y, z = point
+        best = None
+        visited = 0
+        for ring in xrange(min_ring, max_ring + 1):
+            ring_size = (2 * ring + 1) ** 3 - (2 * ring - 1) ** 3 if ring else 1
+            visited += ring_size
+            if visited > len(self.cells):
+                # far from the points: scanning the occupied cells is cheaper than walking more rings
+                keys = self.cells
+            else:
+                keys = self.ring(center, ring)
+            for key in keys:
+                for i in self.cells.get(key, ()):
+                    p = self.points[i]
+                    d = (p[0] - x) ** 2 + (p[1] - y) ** 2 + (p[2] - z) ** 2  # squared
+                    if best is None or d < best[0]:
+                        best = d, i
+            # points beyond this ring are at least ring * cell_size away
+            if keys is self.cells or (best and best[0] <= (ring * self.cell_size) ** 2):
+                break
+        return best[1]
 
-    right_joints = list()
-    for jnt in joints_list:
-        pos = cmds.xform(jnt, q=True, t=True, ws=True)
-        if pos[0] > 0 + accuracy:
-            right_joints.append(jnt)
-    wrong_joints = list()
 
-    while right_joints:
-        jntA = right_joints.pop(0)
-        if [x for x in right_joints if distance(jntA, x) < accuracy]:
-            wrong_joints.append(jntA)
+def get_world_positions(objects):
+    """
+    World positions of transforms read through the API in one pass, without an xform command per object
+    """
+    sel = om2.MSelectionList()
+    for obj in objects:
+        sel.add(obj)
+    return [list(om2.MTransformationMatrix(sel.getDagPath(i).inclusiveMatrix()).translation(om2.MSpace.kWorld))
+            for i in xrange(sel.length())]
+
 
-    return wrong_joints
+def get_clusters_in_same_pos(objects, accuracy=0.01):
+    """
+    Groups of objects located at the same point, found with radius queries on a PointHash.
+    Neighbours of neighbours belong to the same group
+    """
+    positions = get_world_positions(objects)
+    grid = PointHash(positions, accuracy)
+    groups = []
+    grouped = set()
+    for i in xrange(len(objects)):
+        if i in grouped:
+            continue
+        group, stack = [i], [i]
+        grouped.add(i)
+        while stack:
+            for j in grid.query_radius(positions[stack.pop()], accuracy):
+                if j not in grouped:
+                    grouped.add(j)
+                    group.append(j)
+                    stack.append(j)
+        if len(group) > 1:
+            groups.append([objects[j] for j in sorted(group)])
+    return groups
 
 
-def get_non_centr_points(vertices, accuracy):
+def get_jnt_in_same_pos(geometry, accuracy=0.01):
     """
-    Returns a list of geometry vertices excluding those centered on the x-axis (used for mirroring weights)
+    Returns a list of joints from a skin cluster located at the same point: all joints of every group but the last
+    one (in the order of the skin cluster). Used for correct copying of scales
     """
-    result = []
-    for vertex in vertices:
-        x_pos = cmds.pointPosition(vertex)[0]
-        if abs(x_pos) > accuracy:
-            result.append(vertex)
-    return result
+    skin_cluster = cmds.ls(cmds.listHistory(geometry, pdo=1), type='skinCluster')[0]
+    joints_list = cmds.ls(cmds.listHistory(skin_cluster, levels=1), type='joint')
 
+    right_joints = [jnt for jnt, pos in zip(joints_list, get_world_positions(joints_list)) if pos[0] > 0 + accuracy]
+    return [jnt for group in get_clusters_in_same_pos(right_joints, accuracy) for jnt in group[:-1]]
 
-def get_opposite_jnt(jnt, accuracy=0.001):
+
+def get_opposite_jnt(jnt, accuracy=0.001, positions=None):
     """
     Finds a joint matching by name and position on the right side
+    :param positions: {joint: world position} read beforehand, joints that are not in it are queried
     """
     if not jnt:
         return None
@@ -294,9 +419,10 @@ def get_opposite_jnt(jnt, accuracy=0.001):
             # print(l_pattern, r_jnt)
             break
     # test opposite position
-    if r_jnt and cmds.objExists(r_jnt):
-        l_pos = cmds.xform(jnt, q=True, t=True, ws=True)
-        r_pos = cmds.xform(r_jnt, q=True, t=True, ws=True)
+    positions = positions or {}
+    if r_jnt and (r_jnt in positions or cmds.objExists(r_jnt)):
+        l_pos = positions[jnt] if jnt in positions else cmds.xform(jnt, q=True, t=True, ws=True)
+        r_pos = list(positions[r_jnt]) if r_jnt in positions else cmds.xform(r_jnt, q=True, t=True, ws=True)
         r_pos[0] = abs(r_pos[0])
         if distance(l_pos, r_pos) > accuracy:
             return None
@@ -304,57 +430,63 @@ def get_opposite_jnt(jnt, accuracy=0.001):
         return None
     return r_jnt
 
-def temp_joints(l_jnt, r_jnt):
-    cmds.select(cl=True)
-    SFX = '_tmp_jnt'
-    pos = cmds.xform(l_jnt, q=True, t=True, ws=True)
-    pos[1] += uniform(0.02, 0.2)
-    l_tmp_jnt = cmds.joint(n=l_jnt+SFX, p=pos)
-    r_tmp_jnt = None
-    if r_jnt:
-        pos[0] *= -1
-        cmds.select(cl=True)
-        r_tmp_jnt = cmds.joint(n=r_jnt + SFX, p=pos)
-    return l_tmp_jnt, r_tmp_jnt
-
-
-def mirror_weight(geo, accuracy=0.001):
-    # todo: DQ Blend Weight delete error
-    weight = getSkin(geo)
-
-    vertices = cmds.ls(geo + '.vtx[*]', fl=True)
-    if accuracy:
-        vertices = get_non_centr_points(vertices, accuracy)
+def get_symmetry_map(points):
+    """
+    For every point the index of the point closest to its mirrored (-X) position
+    """
+    grid = PointHash(points)
+    return [grid.nearest((-p[0], p[1], p[2])) for p in points]
 
-    l_joints = get_jnt_in_same_pos(geo)
 
-    joints = list()
-    for jnt in l_joints:
-        opposite_jnt = get_opposite_jnt(jnt)
-        joints.append([jnt, opposite_jnt])
+def get_opposite_influences(jnts, accuracy=0.01):
+    """
+    Pairs influences by name (get_opposite_jnt), then by mirrored position. Unpaired influences map to themselves
+    """
+    positions = dict(zip(jnts, get_world_positions(jnts)))
+    grid = PointHash([positions[x] for x in jnts])
+    opposite = {}
+    for jnt in jnts:
+        r_jnt = get_opposite_jnt(jnt, accuracy, positions)
+        if r_jnt in jnts and jnt not in opposite and r_jnt not in opposite:
+            opposite[jnt], opposite[r_jnt] = r_jnt, jnt
+    for jnt in jnts:
+        if jnt in opposite:
+            continue
+        mirrored = [-positions[jnt][0], positions[jnt][1], positions[jnt][2]]
+        candidates = [jnts[i] for i in grid.query_radius(mirrored, accuracy) if jnts[i] not in opposite]
+        candidates.sort(key=lambda x: x != jnt)  # a center joint is its own opposite
+        r_jnt = candidates[0] if candidates else jnt
+        opposite[jnt], opposite[r_jnt] = r_jnt, jnt
+    return opposite
 
-    for l_jnt, r_jnt in joints:
-        l_tmp_jnt, r_tmp_jnt = temp_joints(l_jnt, r_jnt)
-        weight[l_tmp_jnt] = weight.pop(l_jnt)
-        if r_tmp_jnt:
-            weight[r_tmp_jnt] = weight.pop(r_jnt)
 
-    setSkin(geo, weight)
-    skin_cluster = cmds.ls(cmds.listHistory(geo, pdo=1), type='skinCluster')[0]
-    cmds.copySkinWeights(ss=skin_cluster, ds=skin_cluster, mirrorMode='YZ', mirrorInverse=False)
+def mirror_weight(geo, accuracy=0.001):
+    """
+    Mirrors the weights from +X to -X: the columns of opposite joints are swapped in memory and written once
+    into the existing skinCluster
+    """
     weight = getSkin(geo)
-
-    for l_jnt, r_jnt in joints:
-        weight[l_jnt] = weight.pop(l_jnt + '_tmp_jnt')
-        if r_jnt + '_tmp_jnt' in weight.keys():
-            weight[r_jnt] = weight.pop(r_jnt + '_tmp_jnt')
-
-    setSkin(geo, weight)
-
-    for each in joints:
-        for jnt in each:
-            if cmds.objExists(jnt + '_tmp_jnt'):
-                cmds.delete(jnt + '_tmp_jnt')
+    skin_cluster = get_skin_claster(geo)
+    jnts = [x for x in weight.keys() if x not in ("skinningMethod", "paint_weights")]
+
+    sel = om2.MSelectionList()
+    sel.add(cmds.listRelatives(geo, s=True, ni=True, f=True)[0] if cmds.objectType(geo, isAType='transform') else geo)
+    points = [[p.x, p.y, p.z] for p in om2.MFnMesh(sel.getDagPath(0)).getPoints(om2.MSpace.kWorld)]
+    symmetry = get_symmetry_map(points)
+    opposite = get_opposite_influences(jnts, accuracy)
+
+    mirrored = dict((jnt, list(weight[jnt])) for jnt in jnts)
+    paint_weights = list(weight["paint_weights"])
+    for i, p in enumerate(points):
+        if p[0] < -accuracy:
+            for jnt in jnts:
+                mirrored[jnt][i] = weight[opposite[jnt]][symmetry[i]]
+            if len(paint_weights) == len(points):
+                paint_weights[i] = weight["paint_weights"][symmetry[i]]
+
+    set_weights_bulk(skin_cluster, geo, jnts, mirrored)
+    if paint_weights:
+        cmds.setAttr(skin_cluster + '.bw[0:%d]' % (len(paint_weights) - 1), *paint_weights)
 
 
 def right_side_joints_test(geo, accuracy=0.01):